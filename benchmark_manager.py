@@ -0,0 +1,175 @@
+"""Contains the BenchmarkManager class
+"""
+import os
+import random
+import threading
+import time
+from connection_manager import ConnectionManager
+from database_manager import DatabaseManager
+from databases import Databases
+from db_connection_type import DBConnectionType
+from latency_histogram import LatencyHistogram
+from logging_manager import LoggingManager
+from psycopg2 import sql
+from trace_manager import TraceManager
+
+
+class BenchmarkManager:
+    """Runs a pgbench style workload against the primary and replica
+    services and reports throughput and latency percentiles
+    """
+
+    # initialize the managers
+    def __init__(self):
+        self.cm = ConnectionManager()
+        self.dbm = DatabaseManager()
+
+    # provides the results of the last benchmark keyed by service
+    results = {}
+
+    def run_benchmarks(self, primary_cur, has_replicas):
+        """ Runs the read/write mix against the primary service and the
+            read-only mix against the replica service
+
+        Args:
+            primary_cur (connection.cursor): The primary test db cursor
+            has_replicas (bool): True if the replica service is benchmarked
+
+        Returns:
+            dict: The benchmark summary keyed by service
+        """
+        clients = max(1, int(os.getenv('BENCHMARK_CLIENTS')))
+        duration = float(os.getenv('BENCHMARK_DURATION'))
+        write_ratio = float(os.getenv('BENCHMARK_WRITE_RATIO'))
+
+        # index the key used by the benchmark transactions
+        LoggingManager.logger.info("Preparing the benchmark index")
+        # a test database cloned from the template already has it
+        primary_cur.execute(
+            sql.SQL('CREATE INDEX IF NOT EXISTS test_table_s_idx ON {} (s)')
+            .format(sql.Identifier(self.dbm.schema_name, 'test_table')))
+
+        self.results = {}
+        self.results["primary_service"] = self.run_benchmark(
+            DBConnectionType.PRIMARY_SERVICE, clients, duration,
+            write_ratio)
+        if has_replicas:
+            self.results["replica_service"] = self.run_benchmark(
+                DBConnectionType.REPLICA_SERVICE, clients, duration, 0)
+
+        return self.results
+
+    @TraceManager.traced
+    def run_benchmark(self, DBConnectionType, clients, duration,
+                      write_ratio):
+        """ Runs the workload with concurrent clients for a fixed duration
+
+        Args:
+            DBConnectionType (Enum): The service to benchmark
+            clients (int): The number of concurrent clients
+            duration (float): The number of seconds to run
+            write_ratio (float): The fraction of write transactions
+
+        Returns:
+            dict: Transactions, errors, TPS and latency percentiles
+        """
+        LoggingManager.logger.info(
+            "Benchmarking %s with %s client(s) for %s seconds "
+            "(write ratio %s)"
+            % (DBConnectionType, clients, duration, write_ratio))
+
+        histograms = [LatencyHistogram() for _ in range(clients)]
+        errors = [0] * clients
+
+        # set the deadline once every client is connected
+        deadline = []
+        ready = threading.Barrier(
+            clients + 1,
+            action=lambda: deadline.append(time.perf_counter() + duration))
+        threads = [threading.Thread(
+            target=self.run_client,
+            args=(DBConnectionType, write_ratio, ready, deadline,
+                  histograms[i], errors, i)) for i in range(clients)]
+        for thread in threads:
+            thread.start()
+
+        # start every client at the same time once connected
+        ready.wait()
+        started = deadline[0] - duration
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        histogram = LatencyHistogram()
+        for client_histogram in histograms:
+            histogram.merge(client_histogram)
+
+        result = histogram.summary()
+        result["clients"] = clients
+        result["errors"] = sum(errors)
+        result["tps"] = round(histogram.count / elapsed, 1)
+        LoggingManager.logger.info(
+            "Benchmark %s: %s transactions, %s errors, %.1f TPS, "
+            "latency p50 %s ms, p95 %s ms, p99 %s ms"
+            % (DBConnectionType, result["count"], result["errors"],
+               result["tps"], result["p50_ms"], result["p95_ms"],
+               result["p99_ms"]))
+        return result
+
+    def run_client(self, DBConnectionType, write_ratio, ready, deadline,
+                   histogram, errors, client):
+        """ Runs transactions on a dedicated connection until the deadline
+
+        Args:
+            DBConnectionType (Enum): The service to benchmark
+            write_ratio (float): The fraction of write transactions
+            ready (threading.Barrier): Released when all clients connect
+            deadline (list): Holds the perf_counter deadline once started
+            histogram (LatencyHistogram): Records transaction latencies
+            errors (list): Error counts by client
+            client (int): The client number
+        """
+        conn = None
+        try:
+            conn = self.cm.get_connection(Databases.TEST_DB,
+                                          DBConnectionType)
+        except (Exception) as error:
+            LoggingManager.logger.error(error, exc_info=True)
+        finally:
+            ready.wait()
+
+        if conn is None:
+            errors[client] += 1
+            return
+
+        table = sql.Identifier(self.dbm.schema_name, 'test_table')
+        select_cmd = sql.SQL('SELECT md5 FROM {} WHERE s = %s').format(table)
+        update_cmd = sql.SQL('UPDATE {} SET md5 = md5(random()::text) '
+                             'WHERE s = %s').format(table)
+        row_count = self.dbm.row_count
+
+        try:
+            with conn.cursor() as cur:
+                while time.perf_counter() < deadline[0]:
+                    key = random.randint(1, row_count)
+                    started = time.perf_counter()
+                    try:
+                        if random.random() < write_ratio:
+                            # update and read back the row in a transaction
+                            cur.execute('BEGIN')
+                            cur.execute(update_cmd, (key,))
+                            cur.execute(select_cmd, (key,))
+                            cur.fetchone()
+                            cur.execute('COMMIT')
+                        else:
+                            cur.execute(select_cmd, (key,))
+                            cur.fetchone()
+                        histogram.record(time.perf_counter() - started)
+                    except (Exception) as error:
+                        LoggingManager.logger.debug(error)
+                        errors[client] += 1
+                        if not conn.closed:
+                            cur.execute('ROLLBACK')
+        finally:
+            self.cm.close_connection(conn, Databases.TEST_DB,
+                                     DBConnectionType)
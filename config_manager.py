@@ -23,20 +23,37 @@ class ConfigManager:
             dict: Dictionary containing postgres connection string values
     """
 
-    def __init__(self):
-        self.set_default_config_values()
+    # provides whether the configuration is loaded
+    loaded = False
 
-    # initialize PasswordManager
-    pm = PasswordManager()
-
-    def get_postgres_connection_parameters(self):
+    def load(self):
+        """ Sets the default config values and creates the passwords.
+            Only the first call has an effect.
+        """
+        if not ConfigManager.loaded:
+            ConfigManager.loaded = True
+            self.set_default_config_values()
+            PasswordManager()
+
+    def get_postgres_connection_parameters(
+            self, DBConnectionType=DBConnectionType.PRIMARY_SERVICE,
+            pod=None):
         """ Add postgres db connection parameters to the collection
 
+        Args:
+            DBConnectionType (Enum, optional): Database connection type.
+            Defaults to DBConnectionType.PRIMARY_SERVICE.
+            pod (kubernetes.client.models.v1_pod, optional): \
+            The target replica pod. Defaults to None.
+
         Returns:
             dictionary: Contains postgres db connection parameters
         """
-        params = self.get_db_service_connection_parameters(
-            DBConnectionType.PRIMARY_SERVICE)
+        if DBConnectionType is DBConnectionType.REPLICA_POD:
+            params = self.get_replica_pod_connection_parameters(pod)
+        else:
+            params = self.get_db_service_connection_parameters(
+                DBConnectionType)
         params["database"] = "postgres"
         params["user"] = os.getenv('DB_USER')
         params["password"] = PasswordManager.postgres_password
@@ -65,6 +82,24 @@ class ConfigManager:
         params["password"] = PasswordManager.test_db_password
         return params
 
+    def get_storm_connection_parameters(self, DBConnectionType, pod=None):
+        """ Gets the test_db connection string parameters of the
+            connection storm user, which is not a superuser and so cannot
+            use the reserved connection slots
+
+        Args:
+            DBConnectionType (Enum): Database connection type
+            pod (kubernetes.client.models.v1_pod, optional): \
+            The target replica pod. Defaults to None.
+
+        Returns:
+            dictionary: The connection string parameter key / value pairs.
+        """
+        params = self.get_test_db_connection_parameters(DBConnectionType,
+                                                        pod)
+        params["user"] = "test_storm_user"
+        return params
+
     def get_replica_pod_connection_parameters(self, pod):
         """ Gets the replica pod connection string parameters
 
@@ -113,6 +148,7 @@ class ConfigManager:
         params = {}
         params["port"] = port
         params["sslmode"] = sslmode
+        params["connect_timeout"] = int(os.getenv('CONNECT_TIMEOUT'))
         return params
 
     def set_default_config_values(self):
@@ -123,18 +159,152 @@ class ConfigManager:
         if "ARGOCD_NAMESPACE" not in os.environ:
             os.environ["ARGOCD_NAMESPACE"] = "argocd"
 
+        # defaults the argocd api request timeout to 10 seconds
+        if "ARGOCD_REQUEST_TIMEOUT" not in os.environ:
+            os.environ["ARGOCD_REQUEST_TIMEOUT"] = "10"
+
+        # defaults the wait for a synced and healthy application to 300
+        # seconds
+        if "ARGOCD_SYNC_TIMEOUT" not in os.environ:
+            os.environ["ARGOCD_SYNC_TIMEOUT"] = "300"
+
+        # defaults the first application status poll delay to 1 second
+        if "ARGOCD_POLL_INTERVAL" not in os.environ:
+            os.environ["ARGOCD_POLL_INTERVAL"] = "1"
+
+        # defaults the largest application status poll delay to 15 seconds
+        if "ARGOCD_POLL_MAX_INTERVAL" not in os.environ:
+            os.environ["ARGOCD_POLL_MAX_INTERVAL"] = "15"
+
+        # defaults the benchmark stage to off
+        if "BENCHMARK_ENABLED" not in os.environ:
+            os.environ["BENCHMARK_ENABLED"] = "false"
+
+        # defaults the number of benchmark clients to 4
+        if "BENCHMARK_CLIENTS" not in os.environ:
+            os.environ["BENCHMARK_CLIENTS"] = "4"
+
+        # defaults the benchmark duration to 10 seconds per service
+        if "BENCHMARK_DURATION" not in os.environ:
+            os.environ["BENCHMARK_DURATION"] = "10"
+
+        # defaults the primary service benchmark write ratio to 0.5
+        if "BENCHMARK_WRITE_RATIO" not in os.environ:
+            os.environ["BENCHMARK_WRITE_RATIO"] = "0.5"
+
         # defaults the log level to info
         if "ARGOCD_VERIFY_TLS" not in os.environ:
             os.environ["ARGOCD_VERIFY_TLS"] = "true"
 
+        # defaults database connection pooling to off
+        if "DB_CONNECTION_POOLING" not in os.environ:
+            os.environ["DB_CONNECTION_POOLING"] = "false"
+
+        # defaults the maximum open connections per pool key to 10
+        if "DB_POOL_MAX_SIZE" not in os.environ:
+            os.environ["DB_POOL_MAX_SIZE"] = "10"
+
+        # defaults the pooled connection idle time to 300 seconds
+        if "DB_POOL_MAX_IDLE_TIME" not in os.environ:
+            os.environ["DB_POOL_MAX_IDLE_TIME"] = "300"
+
+        # defaults the wait for a pooled connection to 30 seconds
+        if "DB_POOL_TIMEOUT" not in os.environ:
+            os.environ["DB_POOL_TIMEOUT"] = "30"
+
+        # defaults failover detection to polling
+        if "FAILOVER_DETECTION" not in os.environ:
+            os.environ["FAILOVER_DETECTION"] = "poll"
+
+        # defaults the failover watch timeout to 300 seconds
+        if "FAILOVER_WATCH_TIMEOUT" not in os.environ:
+            os.environ["FAILOVER_WATCH_TIMEOUT"] = "300"
+
+        # defaults the log format to text
+        if "LOG_FORMAT" not in os.environ:
+            os.environ["LOG_FORMAT"] = "text"
+
+        # defaults the fixture mode to a new test database for each run
+        if "FIXTURE_MODE" not in os.environ:
+            os.environ["FIXTURE_MODE"] = "database"
+
+        # defaults promotion to ignore run history regressions
+        if "GATE_BLOCK_ON_REGRESSION" not in os.environ:
+            os.environ["GATE_BLOCK_ON_REGRESSION"] = "false"
+
         # defaults the log level to info
         if "LOG_LEVEL" not in os.environ:
             os.environ["LOG_LEVEL"] = "info"
 
+        # defaults log rotation to size based
+        if "LOG_ROTATION" not in os.environ:
+            os.environ["LOG_ROTATION"] = "size"
+
+        # defaults the log file size limit to 10 MiB
+        if "LOG_MAX_BYTES" not in os.environ:
+            os.environ["LOG_MAX_BYTES"] = "10485760"
+
+        # defaults time based log rotation to midnight
+        if "LOG_ROTATE_WHEN" not in os.environ:
+            os.environ["LOG_ROTATE_WHEN"] = "midnight"
+
+        # defaults the number of rotated log files kept to 5
+        if "LOG_BACKUP_COUNT" not in os.environ:
+            os.environ["LOG_BACKUP_COUNT"] = "5"
+
+        # defaults rotated log file compression to on
+        if "LOG_COMPRESS" not in os.environ:
+            os.environ["LOG_COMPRESS"] = "true"
+
         # defaults the log path to /pgdata
         if "LOG_PATH" not in os.environ:
             os.environ["LOG_PATH"] = "/pgdata"
 
+        # defaults the metrics endpoint to off
+        if "METRICS_ENABLED" not in os.environ:
+            os.environ["METRICS_ENABLED"] = "false"
+
+        # defaults the metrics port to 8000
+        if "METRICS_PORT" not in os.environ:
+            os.environ["METRICS_PORT"] = "8000"
+
+        # defaults the run history to off
+        if "RUN_HISTORY_ENABLED" not in os.environ:
+            os.environ["RUN_HISTORY_ENABLED"] = "false"
+
+        # defaults the run history file to the log path
+        if "RUN_HISTORY_PATH" not in os.environ:
+            os.environ["RUN_HISTORY_PATH"] = os.environ["LOG_PATH"] \
+                + "/self_test_history.jsonl"
+
+        # defaults the number of runs kept in the history to 100
+        if "RUN_HISTORY_MAX_RUNS" not in os.environ:
+            os.environ["RUN_HISTORY_MAX_RUNS"] = "100"
+
+        # defaults the regression baseline to the last 10 successful runs
+        if "RUN_HISTORY_BASELINE_RUNS" not in os.environ:
+            os.environ["RUN_HISTORY_BASELINE_RUNS"] = "10"
+
+        # defaults the regression threshold to 2x the baseline
+        if "REGRESSION_RATIO" not in os.environ:
+            os.environ["REGRESSION_RATIO"] = "2.0"
+
+        # defaults the smallest stage slowdown flagged to 0.5 seconds
+        if "REGRESSION_MIN_SECONDS" not in os.environ:
+            os.environ["REGRESSION_MIN_SECONDS"] = "0.5"
+
+        # defaults the first connection retry delay bound to 0.25 seconds
+        if "CONN_RETRY_INITIAL_DELAY" not in os.environ:
+            os.environ["CONN_RETRY_INITIAL_DELAY"] = "0.25"
+
+        # defaults the largest connection retry delay to 10 seconds
+        if "CONN_RETRY_MAX_DELAY" not in os.environ:
+            os.environ["CONN_RETRY_MAX_DELAY"] = "10"
+
+        # defaults the libpq connect timeout to 10 seconds
+        if "CONNECT_TIMEOUT" not in os.environ:
+            os.environ["CONNECT_TIMEOUT"] = "10"
+
         # defaults the number of attempts to 6
         if "POSTGRES_CONN_ATTEMPTS" not in os.environ:
             os.environ["POSTGRES_CONN_ATTEMPTS"] = "6"
@@ -143,10 +313,152 @@ class ConfigManager:
         if "POSTGRES_CONN_INTERVAL" not in os.environ:
             os.environ["POSTGRES_CONN_INTERVAL"] = "10"
 
+        # defaults the connection retry deadline to the time the legacy
+        # attempts and interval allowed
+        if "CONN_RETRY_DEADLINE" not in os.environ:
+            os.environ["CONN_RETRY_DEADLINE"] = str(
+                int(os.environ["POSTGRES_CONN_ATTEMPTS"])
+                * float(os.environ["POSTGRES_CONN_INTERVAL"]))
+
+        # defaults the number of concurrent replica validations to 4
+        if "REPLICA_VALIDATION_WORKERS" not in os.environ:
+            os.environ["REPLICA_VALIDATION_WORKERS"] = "4"
+
+        # defaults the replication catch-up deadline to 60 seconds
+        if "REPLICATION_TIMEOUT" not in os.environ:
+            os.environ["REPLICATION_TIMEOUT"] = "60"
+
+        # defaults the replication catch-up poll interval to 0.1 seconds
+        if "REPLICATION_POLL_INTERVAL" not in os.environ:
+            os.environ["REPLICATION_POLL_INTERVAL"] = "0.1"
+
+        # defaults the rows loaded into each test table to 1000
+        if "TEST_ROW_COUNT" not in os.environ:
+            os.environ["TEST_ROW_COUNT"] = "1000"
+
+        # defaults the test row payload width to 32 characters
+        if "TEST_ROW_WIDTH" not in os.environ:
+            os.environ["TEST_ROW_WIDTH"] = "32"
+
+        # defaults the number of test tables to 1
+        if "TEST_TABLE_COUNT" not in os.environ:
+            os.environ["TEST_TABLE_COUNT"] = "1"
+
+        # defaults replica pod validation to row counts
+        if "VALIDATION_MODE" not in os.environ:
+            os.environ["VALIDATION_MODE"] = "count"
+
+        # defaults the checksum key range to 100000 rows
+        if "CHECKSUM_CHUNK_SIZE" not in os.environ:
+            os.environ["CHECKSUM_CHUNK_SIZE"] = "100000"
+
+        # defaults the wait for this pod to become ready to 60 seconds
+        if "READINESS_TIMEOUT" not in os.environ:
+            os.environ["READINESS_TIMEOUT"] = "60"
+
+        # defaults the run mode to a sidecar in the postgres pod
+        if "RUN_MODE" not in os.environ:
+            os.environ["RUN_MODE"] = "sidecar"
+
+        # defaults the controller to every postgres cluster
+        if "CONTROLLER_LABEL_SELECTOR" not in os.environ:
+            os.environ["CONTROLLER_LABEL_SELECTOR"] = ""
+
+        # defaults the number of clusters tested at once to 4
+        if "CONTROLLER_WORKERS" not in os.environ:
+            os.environ["CONTROLLER_WORKERS"] = "4"
+
+        # defaults the controller test interval to 300 seconds
+        if "CONTROLLER_INTERVAL" not in os.environ:
+            os.environ["CONTROLLER_INTERVAL"] = "300"
+
+        # defaults the time allowed for testing a cluster to 600 seconds
+        if "CLUSTER_BUDGET" not in os.environ:
+            os.environ["CLUSTER_BUDGET"] = "600"
+
+        # defaults scheduled test runs to off
+        if "SCHEDULE_INTERVAL" not in os.environ:
+            os.environ["SCHEDULE_INTERVAL"] = "0"
+
+        # defaults the random delay added to each scheduled run to up to
+        # 30 seconds
+        if "SCHEDULE_JITTER" not in os.environ:
+            os.environ["SCHEDULE_JITTER"] = "30"
+
+        # defaults every scheduled run to a full test run
+        if "SCHEDULE_FULL_RUN_EVERY" not in os.environ:
+            os.environ["SCHEDULE_FULL_RUN_EVERY"] = "1"
+
+        # defaults the time allowed for a scheduled run to 600 seconds
+        if "RUN_BUDGET" not in os.environ:
+            os.environ["RUN_BUDGET"] = "600"
+
+        # defaults the replication visibility probe to off
+        if "VISIBILITY_PROBE_ENABLED" not in os.environ:
+            os.environ["VISIBILITY_PROBE_ENABLED"] = "false"
+
+        # defaults the heartbeat rate to 10 per second
+        if "VISIBILITY_PROBE_RATE" not in os.environ:
+            os.environ["VISIBILITY_PROBE_RATE"] = "10"
+
+        # defaults the heartbeat writing time to 10 seconds
+        if "VISIBILITY_PROBE_DURATION" not in os.environ:
+            os.environ["VISIBILITY_PROBE_DURATION"] = "10"
+
+        # defaults the replica heartbeat poll interval to 5 milliseconds
+        if "VISIBILITY_PROBE_POLL_INTERVAL" not in os.environ:
+            os.environ["VISIBILITY_PROBE_POLL_INTERVAL"] = "0.005"
+
+        # defaults the connection storm test to off
+        if "CONNECTION_STORM_ENABLED" not in os.environ:
+            os.environ["CONNECTION_STORM_ENABLED"] = "false"
+
+        # defaults the concurrent connection attempts per target to 50
+        if "CONNECTION_STORM_SIZE" not in os.environ:
+            os.environ["CONNECTION_STORM_SIZE"] = "50"
+
+        # defaults the sslmode comparison benchmark to off
+        if "TLS_BENCHMARK_ENABLED" not in os.environ:
+            os.environ["TLS_BENCHMARK_ENABLED"] = "false"
+
+        # defaults the compared sslmodes to plaintext and require
+        if "TLS_BENCHMARK_SSLMODES" not in os.environ:
+            os.environ["TLS_BENCHMARK_SSLMODES"] = "disable,require"
+
+        # defaults the connections per sslmode and target to 20
+        if "TLS_BENCHMARK_CYCLES" not in os.environ:
+            os.environ["TLS_BENCHMARK_CYCLES"] = "20"
+
+        # defaults the queries per benchmark connection to 20
+        if "TLS_BENCHMARK_QUERIES" not in os.environ:
+            os.environ["TLS_BENCHMARK_QUERIES"] = "20"
+
+        # defaults the failover recovery time measurement to off
+        if "FAILOVER_RTO_ENABLED" not in os.environ:
+            os.environ["FAILOVER_RTO_ENABLED"] = "false"
+
+        # defaults the failover write and read probe interval to 100 ms
+        if "FAILOVER_RTO_INTERVAL" not in os.environ:
+            os.environ["FAILOVER_RTO_INTERVAL"] = "0.1"
+
+        # defaults the failover probe connect and statement timeout to 2
+        # seconds
+        if "FAILOVER_RTO_CONNECT_TIMEOUT" not in os.environ:
+            os.environ["FAILOVER_RTO_CONNECT_TIMEOUT"] = "2"
+
+        # defaults the wait for a role label move after writes resume
+        # to 10 seconds
+        if "FAILOVER_RTO_SETTLE" not in os.environ:
+            os.environ["FAILOVER_RTO_SETTLE"] = "10"
+
+        # defaults the longest measured failover to 300 seconds
+        if "FAILOVER_RTO_TIMEOUT" not in os.environ:
+            os.environ["FAILOVER_RTO_TIMEOUT"] = "300"
+
         # defaults the service port to 5432
         if "SERVICE_PORT" not in os.environ:
             os.environ["SERVICE_PORT"] = "5432"
 
         # defaults the sslmode to require
         if "SSLMODE" not in os.environ:
-            os.environ["MODE"] = "require"
+            os.environ["SSLMODE"] = "require"
@@ -5,12 +5,16 @@ Returns:
 """
 import os
 import psycopg2
+import threading
 import time
 from config_manager import ConfigManager
+from connection_pool import ConnectionPool
 from databases import Databases
 from db_connection_type import DBConnectionType
-from kubernetes import client, config
 from logging_manager import LoggingManager
+from metrics_manager import MetricsManager
+from retry_policy import RetryPolicy
+from trace_manager import TraceManager
 
 
 class ConnectionManager:
@@ -18,13 +22,33 @@ class ConnectionManager:
     """
 
     def __init__(self):
-        if not hasattr(ConnectionManager, 'kubernetes_connection'):
-            ConnectionManager.kubernetes_connection = \
-                self.connect_to_kubernetes()
+        # initialize the managers
+        self.cm = ConfigManager()
+        self.mm = MetricsManager()
+        if not hasattr(ConnectionManager, 'pool'):
+            ConnectionManager.pool = self.create_connection_pool()
+        if not hasattr(ConnectionManager, 'retry_policy'):
+            ConnectionManager.retry_policy = self.create_retry_policy()
 
-    # initialize globals
-    cm = ConfigManager()
-    lm = LoggingManager()
+    # the kubernetes client is created on first use
+    kubernetes_connection = None
+    kubernetes_lock = threading.Lock()
+
+    # connections handed out and not closed yet, keyed by id
+    active_connections = {}
+    active_lock = threading.Lock()
+
+    def get_kubernetes_connection(self):
+        """ Gets the kubernetes client, connecting on first use
+
+        Returns:
+            kubernetes.client.CoreV1Api: The kubernetes client
+        """
+        with ConnectionManager.kubernetes_lock:
+            if ConnectionManager.kubernetes_connection is None:
+                ConnectionManager.kubernetes_connection = \
+                    self.connect_to_kubernetes()
+        return ConnectionManager.kubernetes_connection
 
     # provides postgres db connection
     @property
@@ -67,119 +91,265 @@ class ConnectionManager:
         return self.replica_pod_db_conn
 
     # connects to postgres db and sets local connection variable
+    @TraceManager.traced
     def connect_to_postgres_db(self):
         """ Connects to the postgres database
             while allowing time to initialize
         """
         self._conn = None
-        connection_attempt = 0
-        connected = False
-
-        # gets postgres wait for init values
-        attempts = int(os.getenv('POSTGRES_CONN_ATTEMPTS'))
-        interval = int(os.getenv('POSTGRES_CONN_INTERVAL'))
-
-        # Allow time for postgres to initialize
-        while connected is False:
-            try:
-                connection_attempt += 1
-                LoggingManager.logger.debug('Connection attempt number:'
-                                            + str(connection_attempt))
-
-                # read connection parameters
-                params = self.cm.get_postgres_connection_parameters()
-
-                # connect to the PostgreSQL server
-                self._conn = psycopg2.connect(**params)
-                LoggingManager.logger.debug(
-                    'Connecting to the postgres database...')
-                self._conn.autocommit = True
-                connected = True
 
-            except (Exception, psycopg2.DatabaseError) as error:
-                # wait for the desired period and try again
-                # up to the allotted attempts
-                if connection_attempt < attempts:
-                    LoggingManager.logger.debug(
-                        'Postgres is still initializing.')
-                    time.sleep(interval)
-                    continue
-                else:
-                    # log exception if postgres is not up within allotted time
-                    LoggingManager.logger.error(error, exc_info=True)
-                    self.close_connection(self._conn, Databases.POSTGRES,
-                                          DBConnectionType.PRIMARY_SERVICE)
+        try:
+            # connect to the PostgreSQL server
+            LoggingManager.logger.debug(
+                'Connecting to the postgres database...')
+            self._conn = self.get_connection(
+                Databases.POSTGRES, DBConnectionType.PRIMARY_SERVICE)
+        except (Exception, psycopg2.DatabaseError) as error:
+            # log exception if postgres is not up within allotted time
+            LoggingManager.logger.error(
+                error, exc_info=True,
+                extra={"stage": "connect_postgres_db",
+                       "outcome": "failure"})
+            self.close_connection(self._conn, Databases.POSTGRES,
+                                  DBConnectionType.PRIMARY_SERVICE)
 
     # connects to test db and sets local connection variable
+    @TraceManager.traced
     def connect_to_primary_test_db(self):
         """ Connects to the primary test database
         """
         self.primary_test_db_conn = None
 
         try:
-            # read connection parameters
-            params = self.cm.get_test_db_connection_parameters(
-                DBConnectionType.PRIMARY_SERVICE)
             # connect to the PostgreSQL server
             LoggingManager.logger.debug(
                 'Connecting to the primary test database...')
-            self.primary_test_db_conn = psycopg2.connect(**params)
-            self.primary_test_db_conn.autocommit = True
+            self.primary_test_db_conn = self.get_connection(
+                Databases.TEST_DB, DBConnectionType.PRIMARY_SERVICE)
         except (Exception, psycopg2.DatabaseError) as error:
-            LoggingManager.logger.error(error, exc_info=True)
+            LoggingManager.logger.error(
+                error, exc_info=True,
+                extra={"stage": "connect",
+                       "connection_type": "PRIMARY_SERVICE",
+                       "outcome": "failure"})
             self.close_connection(self.primary_test_db_conn,
                                   Databases.TEST_DB,
                                   DBConnectionType.PRIMARY_SERVICE)
 
     # connects to test db via replica service
     # and sets local connection variables
+    @TraceManager.traced
     def connect_to_replica_test_db_via_replica_service(self):
         """ Connects to the replica test database
         """
         self.replica_test_db_conn = None
 
         try:
-            # read connection parameters
-            params = self.cm.get_test_db_connection_parameters(
-                DBConnectionType.REPLICA_SERVICE)
             # connect to the PostgreSQL server
             LoggingManager.logger.debug(
                 'Connecting to the replica test '
                 'database via the replica service...')
-            self.replica_test_db_conn = psycopg2.connect(**params)
-            self.replica_test_db_conn.autocommit = True
+            self.replica_test_db_conn = self.get_connection(
+                Databases.TEST_DB, DBConnectionType.REPLICA_SERVICE)
         except (Exception, psycopg2.DatabaseError) as error:
-            LoggingManager.logger.error(error, exc_info=True)
+            LoggingManager.logger.error(
+                error, exc_info=True,
+                extra={"stage": "connect",
+                       "connection_type": "REPLICA_SERVICE",
+                       "outcome": "failure"})
             self.close_connection(self.replica_test_db_conn,
                                   Databases.TEST_DB,
                                   DBConnectionType.REPLICA_SERVICE)
 
-        # connects to test db via replica service and
-        # sets local connection variables
+    # connects to test db via replica pod and
+    # sets local connection variables
+    @TraceManager.traced
     def connect_to_replica_test_db_via_replica_pod(self, pod):
         """ Connects to the replica test database
         """
-        self.replica_pod_db_conn = None
+        self.replica_pod_db_conn = \
+            self.open_replica_pod_test_db_connection(pod)
+
+    # opens a dedicated test db connection to a replica pod
+    @TraceManager.traced
+    def open_replica_pod_test_db_connection(self, pod, deadline=None,
+                                            is_retryable=None):
+        """ Opens a new connection to the replica test database via the
+            replica pod without storing it on the ConnectionManager.
+            Each caller owns the returned connection, which allows replica
+            pods to be validated concurrently.
+
+        Args:
+            pod (kubernetes.client.models.v1_pod): The target replica pod
+            deadline (float, optional): perf_counter value to stop
+            retrying at. Defaults to the retry policy deadline.
+            is_retryable (function, optional): Decides if a failed attempt
+            is retried. Defaults to RetryPolicy.is_retryable_connect_error.
+
+        Returns:
+            psycopg2.connection: A connection to the test database or None
+        """
+        conn = None
 
         try:
-            # read connection parameters
-            params = self.cm.get_test_db_connection_parameters(
-                DBConnectionType.REPLICA_POD, pod)
             # connect to the PostgreSQL server
             LoggingManager.logger.debug(
                 'Connecting to the replica test database via %s...',
                 pod.metadata.name)
-            self.replica_pod_db_conn = psycopg2.connect(**params)
-            self.replica_pod_db_conn.autocommit = True
+            conn = self.get_connection(Databases.TEST_DB,
+                                       DBConnectionType.REPLICA_POD, pod,
+                                       deadline, is_retryable)
         except (Exception, psycopg2.DatabaseError) as error:
-            LoggingManager.logger.error(error, exc_info=True)
-            self.close_connection(self.replica_pod_db_conn,
-                                  Databases.TEST_DB,
+            LoggingManager.logger.error(
+                error, exc_info=True,
+                extra={"stage": "connect",
+                       "connection_type": "REPLICA_POD",
+                       "replica_pod": pod.metadata.name,
+                       "outcome": "failure"})
+            self.close_connection(conn, Databases.TEST_DB,
                                   DBConnectionType.REPLICA_POD)
+            conn = None
+
+        return conn
+
+    # provides a connection handle owned by the caller
+    def get_connection(self, Databases, DBConnectionType, pod=None,
+                       deadline=None, is_retryable=None):
+        """ Gets an autocommit connection that the caller owns until it is
+            passed to close_connection. The connection is borrowed from the
+            pool when pooling is enabled, so handles can be used
+            concurrently without sharing state on the ConnectionManager.
+            Failed attempts are retried by the retry policy.
+
+        Args:
+            Databases Enum: The database to connect to
+            DBConnectionType Enum: The type of connection
+            pod (kubernetes.client.models.v1_pod, optional): \
+            The target replica pod. Defaults to None.
+            deadline (float, optional): perf_counter value to stop
+            retrying at. Defaults to the retry policy deadline.
+            is_retryable (function, optional): Decides if a failed attempt
+            is retried. Defaults to RetryPolicy.is_retryable_connect_error.
 
+        Returns:
+            psycopg2.connection: A connection to the database
+        """
+        if is_retryable is None:
+            is_retryable = RetryPolicy.is_retryable_connect_error
+
+        # read connection parameters
+        if Databases == Databases.POSTGRES:
+            params = self.cm.get_postgres_connection_parameters(
+                DBConnectionType, pod)
+        else:
+            params = self.cm.get_test_db_connection_parameters(
+                DBConnectionType, pod)
+
+        return ConnectionManager.retry_policy.run(
+            lambda: self.open_connection(params, DBConnectionType),
+            is_retryable,
+            'Connecting to %s on %s' % (params["database"], params["host"]),
+            lambda attempt, error: self.mm.record_connect_retry(
+                DBConnectionType),
+            deadline)
+
+    def open_connection(self, params, DBConnectionType):
+        """ Makes one attempt to borrow or open a connection
+
+        Args:
+            params (dictionary): The connection string parameters
+            DBConnectionType Enum: The type of connection
+
+        Returns:
+            psycopg2.connection: A connection to the database
+        """
+        started = time.perf_counter()
+        try:
+            if ConnectionManager.pool is not None:
+                conn = ConnectionManager.pool.borrow(params)
+            else:
+                conn = psycopg2.connect(**params)
+        except (Exception):
+            self.mm.record_connect_attempt(
+                DBConnectionType, time.perf_counter() - started, False)
+            raise
+        duration = time.perf_counter() - started
+        self.mm.record_connect_attempt(DBConnectionType, duration, True)
+        LoggingManager.logger.debug(
+            'Connected to %s on %s in %.3f seconds',
+            params["database"], params["host"], duration,
+            extra={"stage": "connect",
+                   "connection_type": DBConnectionType.name,
+                   "host": params["host"], "database": params["database"],
+                   "duration_ms": round(duration * 1000, 3),
+                   "outcome": "success"})
+        conn.autocommit = True
+        self.track_connection(conn)
+        return conn
+
+    @staticmethod
+    def track_connection(conn):
+        """ Adds a connection to those cancel_active_queries signals.
+            Connections opened outside get_connection register here.
+
+        Args:
+            conn (psycopg2.connection): The open connection
+        """
+        with ConnectionManager.active_lock:
+            ConnectionManager.active_connections[id(conn)] = conn
+
+    @staticmethod
+    def untrack_connection(conn):
+        """ Removes a connection from those cancel_active_queries signals
+
+        Args:
+            conn (psycopg2.connection): The connection being closed
+        """
+        with ConnectionManager.active_lock:
+            ConnectionManager.active_connections.pop(id(conn), None)
+
+    def create_retry_policy(self):
+        """ Creates the retry policy shared by all connection types
+
+        Returns:
+            RetryPolicy: The connection retry policy
+        """
+        return RetryPolicy(float(os.getenv('CONN_RETRY_INITIAL_DELAY')),
+                           float(os.getenv('CONN_RETRY_MAX_DELAY')),
+                           float(os.getenv('CONN_RETRY_DEADLINE')))
+
+    def create_connection_pool(self):
+        """ Creates the connection pool if pooling is enabled
+
+        Returns:
+            ConnectionPool: The connection pool or None if disabled
+        """
+        if os.getenv('DB_CONNECTION_POOLING').lower() != 'true':
+            return None
+
+        LoggingManager.logger.debug("Creating the connection pool.")
+        return ConnectionPool(int(os.getenv('DB_POOL_MAX_SIZE')),
+                              float(os.getenv('DB_POOL_MAX_IDLE_TIME')),
+                              float(os.getenv('DB_POOL_TIMEOUT')))
+
+    def close_pooled_connections(self, database=None):
+        """ Closes idle pooled connections so the database or its users
+            can be dropped
+
+        Args:
+            database (str, optional): Only close connections to this
+            database. Defaults to None.
+        """
+        if ConnectionManager.pool is not None:
+            ConnectionManager.pool.close_idle_connections(database)
+            LoggingManager.logger.debug("Closed idle pooled connections.")
+
+    @TraceManager.traced
     def connect_to_kubernetes(self):
         """Connects to the Kubernetes cluster that the container is running in.
         """
+        # imported on first use to keep the sidecar startup fast
+        from kubernetes import client, config
 
         LoggingManager.logger.debug("Connecting to kubernetes.")
         config.load_incluster_config()
@@ -198,28 +368,63 @@ class ConnectionManager:
         """
         if conn is None:
             return
-        conn.close()
 
+        self.untrack_connection(conn)
+
+        # return pooled connections instead of closing them
+        if ConnectionManager.pool is not None:
+            ConnectionManager.pool.release(conn)
+        else:
+            conn.close()
+
+        # only clear a stored slot when closing the stored connection, not
+        # a dedicated handle of the same type
         if Databases == Databases.TEST_DB:
             match DBConnectionType:
                 case DBConnectionType.PRIMARY_SERVICE:
                     LoggingManager.logger.debug('Primary Test Database '
                                                 'connection closed.')
-                    self.primary_test_db_conn = None
+                    if conn is getattr(self, 'primary_test_db_conn', None):
+                        self.primary_test_db_conn = None
                 case DBConnectionType.REPLICA_SERVICE:
                     LoggingManager.logger.debug('Replica Test Database '
                                                 'connection closed.')
-                    self.replica_test_db_conn = None
+                    if conn is getattr(self, 'replica_test_db_conn', None):
+                        self.replica_test_db_conn = None
                 case _:
                     LoggingManager.logger.debug('Replica Pod Database '
                                                 'connection closed.')
-                    self.replica_pod_db_conn = None
+                    if conn is getattr(self, 'replica_pod_db_conn', None):
+                        self.replica_pod_db_conn = None
         else:
             LoggingManager.logger.debug('Postgres Database connection closed.')
-            self._conn = None
+            if conn is getattr(self, '_conn', None):
+                self._conn = None
+
+    def cancel_active_queries(self):
+        """ Cancels the statement running on every open connection. The
+            connections stay open so their owners can still clean up.
+
+        Returns:
+            int: The number of connections signalled
+        """
+        with ConnectionManager.active_lock:
+            connections = list(ConnectionManager.active_connections.values())
+
+        for conn in connections:
+            try:
+                conn.cancel()
+            except (Exception, psycopg2.DatabaseError) as error:
+                LoggingManager.logger.debug(
+                    'Unable to cancel a query: %s', error)
+        return len(connections)
 
     def close_kubernetes_connection(self):
         """Closes the connection to the Kubernetes cluster
         """
+        if ConnectionManager.kubernetes_connection is None:
+            return
+
         ConnectionManager.kubernetes_connection.api_client.close()
+        ConnectionManager.kubernetes_connection = None
         LoggingManager.logger.debug("Closed kubernetes connection.")
@@ -0,0 +1,194 @@
+"""Contains the ConnectionPool class
+"""
+import psycopg2
+import threading
+import time
+from logging_manager import LoggingManager
+
+
+class ConnectionPool:
+    """Keeps reusable postgres database connections keyed by their
+    connection parameters
+    """
+
+    def __init__(self, max_size, max_idle_time, timeout):
+        """ Initializes the pool
+
+        Args:
+            max_size (int): Maximum open connections per key
+            max_idle_time (float): Seconds an idle connection is kept
+            timeout (float): Seconds to wait for a connection when the
+                key is at max_size
+        """
+        self.max_size = max_size
+        self.max_idle_time = max_idle_time
+        self.timeout = timeout
+        self._idle = {}
+        self._open = {}
+        self._keys = {}
+        self._condition = threading.Condition()
+
+    @staticmethod
+    def get_key(params):
+        """ Gets the pool key for a set of connection parameters. Every
+            parameter passed to psycopg2.connect is part of the key, so a
+            borrower never gets a connection negotiated with other settings
+            such as a different sslmode.
+
+        Args:
+            params (dictionary): The connection string parameters
+
+        Returns:
+            tuple: The sorted parameter names and values
+        """
+        return tuple(sorted((name, str(value))
+                            for name, value in params.items()))
+
+    def borrow(self, params):
+        """ Borrows a healthy idle connection or opens a new one
+
+        Args:
+            params (dictionary): The connection string parameters
+
+        Raises:
+            TimeoutError: If the key stays at max_size for the timeout
+
+        Returns:
+            psycopg2.connection: A connection owned by the caller
+                until it is released
+        """
+        key = self.get_key(params)
+        deadline = time.monotonic() + self.timeout
+
+        while True:
+            conn = None
+            with self._condition:
+                self.evict_idle()
+                idle = self._idle.get(key)
+                if idle:
+                    conn, _ = idle.pop()
+                elif self._open.get(key, 0) < self.max_size:
+                    # reserve the slot before connecting
+                    self._open[key] = self._open.get(key, 0) + 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(
+                            'Timed out waiting for a pooled connection to '
+                            '%s/%s' % (params.get("host"),
+                                       params.get("database")))
+                    self._condition.wait(remaining)
+                    continue
+
+            # reuse the idle connection if it is still usable
+            if conn is not None:
+                if self.is_healthy(conn):
+                    LoggingManager.logger.debug(
+                        'Reusing pooled connection to %s/%s',
+                        params.get("host"), params.get("database"))
+                    return conn
+                self.discard(conn)
+                continue
+
+            # open a new connection in the reserved slot
+            try:
+                conn = psycopg2.connect(**params)
+            except (Exception):
+                with self._condition:
+                    self._open[key] -= 1
+                    self._condition.notify()
+                raise
+            with self._condition:
+                self._keys[id(conn)] = key
+            return conn
+
+    def release(self, conn):
+        """ Resets the session and returns the connection to the pool
+
+        Args:
+            conn (psycopg2.connection): The borrowed connection
+        """
+        if id(conn) not in self._keys:
+            conn.close()
+            return
+
+        try:
+            # clear any role or session state set by the borrower
+            conn.rollback()
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute('DISCARD ALL')
+        except (Exception, psycopg2.DatabaseError) as error:
+            LoggingManager.logger.debug(
+                'Discarding pooled connection: %s', error)
+            self.discard(conn)
+            return
+
+        with self._condition:
+            key = self._keys[id(conn)]
+            self._idle.setdefault(key, []).append((conn, time.monotonic()))
+            self._condition.notify()
+
+    def discard(self, conn):
+        """ Closes a connection and frees its slot in the pool
+
+        Args:
+            conn (psycopg2.connection): The connection to discard
+        """
+        with self._condition:
+            key = self._keys.pop(id(conn), None)
+            if key is not None:
+                self._open[key] -= 1
+                self._condition.notify()
+        if not conn.closed:
+            conn.close()
+
+    def is_healthy(self, conn):
+        """ Determines if a pooled connection can still be used
+
+        Args:
+            conn (psycopg2.connection): The connection to check
+
+        Returns:
+            bool: True if the connection answered a trivial query
+        """
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            return True
+        except (Exception, psycopg2.DatabaseError):
+            return False
+
+    def evict_idle(self):
+        """ Closes connections that have been idle for longer than
+            max_idle_time. The caller must hold the pool lock.
+        """
+        cutoff = time.monotonic() - self.max_idle_time
+        for key, idle in self._idle.items():
+            expired = [item for item in idle if item[1] < cutoff]
+            for item in expired:
+                idle.remove(item)
+                self._keys.pop(id(item[0]), None)
+                self._open[key] -= 1
+                item[0].close()
+
+    def close_idle_connections(self, database=None):
+        """ Closes idle connections, optionally only those to one database.
+            Connections to a database must be closed before it is dropped.
+
+        Args:
+            database (str, optional): The database name. Defaults to None.
+        """
+        with self._condition:
+            for key, idle in self._idle.items():
+                if database is not None and \
+                        dict(key).get("database") != database:
+                    continue
+                for conn, _ in idle:
+                    self._keys.pop(id(conn), None)
+                    self._open[key] -= 1
+                    conn.close()
+                idle.clear()
+            self._condition.notify_all()
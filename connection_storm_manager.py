@@ -0,0 +1,229 @@
+"""Contains the ConnectionStormManager class
+"""
+import os
+import threading
+from config_manager import ConfigManager
+from connection_manager import ConnectionManager
+from connection_timer import ConnectionTimer
+from db_connection_type import DBConnectionType
+from latency_histogram import LatencyHistogram
+from logging_manager import LoggingManager
+from trace_manager import TraceManager
+
+# the connection phases timed for each attempt
+PHASES = ('tcp', 'tls', 'auth', 'total')
+
+# errors of a server that has no connection slot left
+# 53300 too_many_connections
+REJECTION_MESSAGES = ('too many clients', 'too many connections',
+                      'remaining connection slots are reserved')
+
+
+class ConnectionStormManager:
+    """Opens a burst of concurrent connections to the primary service, the
+    replica service and each replica pod and reports the connection
+    latency by phase, rejected attempts and the max_connections headroom.
+    The storm connects as test_storm_user, which is not a superuser, so
+    the reserved connection slots are not available to it.
+    """
+
+    # initialize the managers
+    def __init__(self):
+        self.cfm = ConfigManager()
+        self.cm = ConnectionManager()
+        self.ct = ConnectionTimer()
+
+    # provides the results of the last storm keyed by target
+    results = {}
+
+    @TraceManager.traced
+    def run_storms(self, replica_pods):
+        """ Runs a connection storm against each target in turn
+
+        Args:
+            replica_pods (list): The replica pods to target
+
+        Returns:
+            dict: Attempt outcomes, phase latencies and headroom by target
+        """
+        size = max(1, int(os.getenv('CONNECTION_STORM_SIZE')))
+        targets = [('primary_service', DBConnectionType.PRIMARY_SERVICE,
+                    None)]
+        if replica_pods:
+            targets.append(('replica_service',
+                            DBConnectionType.REPLICA_SERVICE, None))
+        targets.extend((pod.metadata.name, DBConnectionType.REPLICA_POD,
+                        pod) for pod in replica_pods)
+
+        self.results = {
+            name: self.run_storm(name, DBConnectionType, pod, size)
+            for name, DBConnectionType, pod in targets}
+        return self.results
+
+    def run_storm(self, name, DBConnectionType, pod, size):
+        """ Opens size connections to a target at the same moment and
+            keeps them open until every attempt has finished
+
+        Args:
+            name (str): The target name
+            DBConnectionType (Enum): The type of connection
+            pod (kubernetes.client.models.v1_pod): The target replica pod
+            or None for a service
+            size (int): The number of concurrent connection attempts
+
+        Returns:
+            dict: Attempt outcomes, phase latencies and headroom
+        """
+        params = self.cfm.get_storm_connection_parameters(
+            DBConnectionType, pod)
+        LoggingManager.logger.info(
+            "Opening %s concurrent connections to %s", size, name,
+            extra={"stage": "connection_storm", "target": name})
+
+        timings = [None] * size
+        outcomes = [None] * size
+        connections = [None] * size
+
+        # release every attempt at the same moment
+        ready = threading.Barrier(size)
+        threads = [threading.Thread(
+            target=self.run_attempt,
+            args=(params, ready, timings, outcomes, connections, i))
+            for i in range(size)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        try:
+            # every successful connection is still open
+            usage = self.get_connection_usage(
+                next((conn for conn in connections if conn is not None),
+                     None))
+        finally:
+            for conn in connections:
+                if conn is not None:
+                    self.cm.untrack_connection(conn)
+                    conn.close()
+
+        histograms = {phase: LatencyHistogram() for phase in PHASES}
+        for timing in timings:
+            if timing is None:
+                continue
+            for phase in PHASES:
+                if timing[phase] is not None:
+                    histograms[phase].record(timing[phase])
+
+        result = {"attempts": size,
+                  "connected": outcomes.count('connected'),
+                  "rejected": outcomes.count('rejected'),
+                  "failed": outcomes.count('failed')}
+        result.update({phase: histograms[phase].summary()
+                       for phase in PHASES})
+        result.update(usage)
+
+        LoggingManager.logger.info(
+            "Connection storm on %s: %s of %s connected, %s rejected, %s "
+            "failed. Connect p50 %s ms, p99 %s ms (tcp p99 %s ms, tls p99 "
+            "%s ms, auth p99 %s ms). %s of %s connections in use, "
+            "headroom %s", name, result["connected"], size,
+            result["rejected"], result["failed"], result["total"]["p50_ms"],
+            result["total"]["p99_ms"], result["tcp"]["p99_ms"],
+            result["tls"]["p99_ms"], result["auth"]["p99_ms"],
+            result["peak_connections"], result["max_connections"],
+            result["headroom"],
+            extra={"stage": "connection_storm", "target": name,
+                   "connected": result["connected"],
+                   "rejected": result["rejected"],
+                   "failed": result["failed"],
+                   "headroom": result["headroom"]})
+        if result["rejected"]:
+            LoggingManager.logger.warning(
+                "%s rejected %s of %s connection attempts for lack of "
+                "connection slots", name, result["rejected"], size,
+                extra={"stage": "connection_storm", "target": name,
+                       "outcome": "rejected"})
+        return result
+
+    def run_attempt(self, params, ready, timings, outcomes, connections,
+                    attempt):
+        """ Makes one connection attempt once every attempt is ready.
+            Attempts are not retried so rejections are counted.
+
+        Args:
+            params (dictionary): The connection string parameters
+            ready (threading.Barrier): Released when all attempts start
+            timings (list): Receives the phase seconds by attempt
+            outcomes (list): Receives connected, rejected or failed
+            connections (list): Receives the open connection by attempt
+            attempt (int): The attempt number
+        """
+        ready.wait()
+        try:
+            timing = self.ct.time_connect(params)
+            connections[attempt] = timing.pop("conn")
+            # the run budget can cancel the storm's queries
+            self.cm.track_connection(connections[attempt])
+            timings[attempt] = timing
+            outcomes[attempt] = 'connected'
+        except (Exception) as error:
+            outcomes[attempt] = 'rejected' if self.is_rejection(error) \
+                else 'failed'
+            LoggingManager.logger.debug(
+                "Connection attempt %s to %s %s: %s", attempt,
+                params["host"], outcomes[attempt], str(error).strip())
+
+    @staticmethod
+    def is_rejection(error):
+        """ Determines if a connection attempt failed because the server
+            had no connection slot left
+
+        Args:
+            error (Exception): The connection error
+
+        Returns:
+            bool: True if the attempt was rejected
+        """
+        if getattr(error, 'pgcode', None) == '53300':
+            return True
+        message = str(error).lower()
+        return any(rejection in message for rejection in REJECTION_MESSAGES)
+
+    def get_connection_usage(self, conn):
+        """ Gets the connection limit and the client connections in use
+            on the server of a storm connection. The slots reserved for
+            superusers and for pg_use_reserved_connections members are not
+            available to the storm user.
+
+        Args:
+            conn (psycopg2.connection): An open storm connection or None
+
+        Returns:
+            dict: max_connections, reserved_connections, peak_connections
+                and headroom. Values are None if they could not be read.
+        """
+        usage = {"max_connections": None, "reserved_connections": None,
+                 "peak_connections": None, "headroom": None}
+        if conn is None:
+            return usage
+
+        try:
+            # reserved_connections only exists from postgres 16
+            cur = self.ct.execute(
+                conn,
+                "SELECT current_setting('max_connections')::int, "
+                "current_setting('superuser_reserved_connections')::int "
+                "+ coalesce(current_setting('reserved_connections', true)"
+                "::int, 0), (SELECT count(*) FROM pg_stat_activity "
+                "WHERE backend_type = 'client backend')")
+            max_connections, reserved, in_use = cur.fetchone()
+            cur.close()
+        except (Exception) as error:
+            LoggingManager.logger.error(error, exc_info=True)
+            return usage
+
+        usage.update({"max_connections": max_connections,
+                      "reserved_connections": reserved,
+                      "peak_connections": in_use,
+                      "headroom": max_connections - reserved - in_use})
+        return usage
@@ -0,0 +1,133 @@
+"""Contains the ConnectionTimer class
+"""
+import ctypes
+import psycopg2
+import select
+import time
+from psycopg2 import extensions
+
+# libpq states of a connection that is being opened
+# CONNECTION_STARTED waits for the TCP connect to complete
+# CONNECTION_SSL_STARTUP negotiates TLS
+CONNECTION_STARTED = 2
+CONNECTION_SSL_STARTUP = 7
+
+
+class ConnectionTimer:
+    """Times the TCP, TLS and startup/authentication phases of a postgres
+    connection. The connection is opened asynchronously and libpq's state
+    is read after each step, so every phase is timed on the connection that
+    is returned. The returned connections are asynchronous, so queries are
+    run on them with execute.
+    """
+
+    # provides libpq's PQstatus, looked up on first use
+    pq_status = None
+
+    @classmethod
+    def get_status(cls, conn):
+        """ Gets the libpq state of a connection
+
+        Args:
+            conn (psycopg2.connection): The connection
+
+        Returns:
+            int: The libpq ConnStatusType
+        """
+        if cls.pq_status is None:
+            # psycopg2 links libpq, so its symbols resolve through the
+            # extension module
+            pq_status = ctypes.CDLL(psycopg2._psycopg.__file__).PQstatus
+            pq_status.argtypes = [ctypes.c_void_p]
+            pq_status.restype = ctypes.c_int
+            cls.pq_status = pq_status
+        return cls.pq_status(conn.pgconn_ptr)
+
+    def time_connect(self, params):
+        """ Opens a connection and times its phases
+
+        Args:
+            params (dictionary): The connection string parameters.
+            connect_timeout bounds the whole connection.
+
+        Returns:
+            dict: The tcp, tls, auth and total seconds and the open
+                connection under conn. tls is None if TLS was not used.
+        """
+        started = time.perf_counter()
+        deadline = started + float(params["connect_timeout"]) \
+            if params.get("connect_timeout") else None
+        conn = psycopg2.connect(async_=True, **params)
+        tcp_done = None
+        tls_done = None
+        in_tls = False
+
+        try:
+            while True:
+                now = time.perf_counter()
+                state = conn.poll()
+                status = self.get_status(conn)
+                if tcp_done is None and status != CONNECTION_STARTED:
+                    tcp_done = now
+                if status == CONNECTION_SSL_STARTUP:
+                    in_tls = True
+                elif in_tls and tls_done is None:
+                    tls_done = now
+                if state == extensions.POLL_OK:
+                    break
+                self.wait_for_socket(conn, state, deadline)
+        except (Exception):
+            conn.close()
+            raise
+
+        total = time.perf_counter() - started
+        tcp = tcp_done - started
+        # a declined SSLRequest is part of the startup
+        tls = tls_done - tcp_done \
+            if tls_done is not None and conn.info.ssl_in_use else None
+        return {"tcp": tcp, "tls": tls,
+                "auth": max(0.0, total - tcp - (tls or 0.0)),
+                "total": total, "conn": conn}
+
+    def execute(self, conn, query, args=None):
+        """ Runs a query on an asynchronous connection and waits for it
+
+        Args:
+            conn (psycopg2.connection): A connection from time_connect
+            query (str or sql.Composed): The query
+            args (tuple, optional): The query arguments. Defaults to None.
+
+        Returns:
+            psycopg2.cursor: The cursor holding the results
+        """
+        cur = conn.cursor()
+        cur.execute(query, args)
+        while True:
+            state = conn.poll()
+            if state == extensions.POLL_OK:
+                return cur
+            self.wait_for_socket(conn, state, None)
+
+    @staticmethod
+    def wait_for_socket(conn, state, deadline):
+        """ Waits until the connection's socket is ready for the next step
+
+        Args:
+            conn (psycopg2.connection): The asynchronous connection
+            state (int): The poll state, POLL_READ or POLL_WRITE
+            deadline (float): perf_counter value to give up at or None
+
+        Raises:
+            psycopg2.OperationalError: If the deadline passes
+        """
+        poller = select.poll()
+        poller.register(conn.fileno(), select.POLLIN
+                        if state == extensions.POLL_READ else select.POLLOUT)
+        if deadline is None:
+            ready = poller.poll()
+        else:
+            remaining = deadline - time.perf_counter()
+            ready = poller.poll(max(0, remaining) * 1000) \
+                if remaining > 0 else []
+        if not ready:
+            raise psycopg2.OperationalError('timeout expired')
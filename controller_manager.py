@@ -0,0 +1,258 @@
+"""Contains the ControllerManager class
+"""
+import base64
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from connection_manager import ConnectionManager
+from logging_manager import LoggingManager
+from metrics_manager import MetricsManager
+
+# exit status of a test run on a pod that is not the primary
+EXIT_NOT_PRIMARY = 2
+
+
+class ControllerManager:
+    """Discovers the postgres clusters matching a label selector across
+    namespaces and runs the test pipeline against each of them in a
+    bounded number of concurrent child processes
+    """
+
+    # initialize the managers
+    def __init__(self):
+        self.cm = ConnectionManager()
+        self.mm = MetricsManager()
+
+    group = 'postgres-operator.crunchydata.com'
+    version = 'v1beta1'
+    plural = 'postgresclusters'
+    primary_label = 'postgres-operator.crunchydata.com/role=master'
+    cluster_label = 'postgres-operator.crunchydata.com/cluster'
+
+    # provides the results of the last pass keyed by namespace/cluster
+    results = {}
+
+    def run(self):
+        """ Tests every matching cluster every CONTROLLER_INTERVAL seconds
+            until the process exits
+        """
+        interval = float(os.getenv('CONTROLLER_INTERVAL'))
+        while True:
+            started = time.perf_counter()
+            try:
+                self.run_all()
+            except (Exception) as error:
+                LoggingManager.logger.error(error, exc_info=True)
+            time.sleep(max(0, interval - (time.perf_counter() - started)))
+
+    def run_all(self):
+        """ Runs the pipeline against every matching cluster concurrently
+            and logs the aggregated results
+
+        Returns:
+            dict: The result of each cluster keyed by namespace/cluster
+        """
+        workers = max(1, int(os.getenv('CONTROLLER_WORKERS')))
+        clusters = self.discover_clusters()
+        LoggingManager.logger.info(
+            "Testing %s postgres cluster(s) with %s worker(s)",
+            len(clusters), workers,
+            extra={"stage": "controller", "clusters": len(clusters)})
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(
+                lambda cluster: self.run_cluster(*cluster), clusters))
+
+        self.results = {}
+        for result in results:
+            key = '%s/%s' % (result["namespace"], result["cluster"])
+            self.results[key] = result
+            self.mm.record_cluster_run(result)
+
+        outcomes = [result["outcome"] for result in results]
+        LoggingManager.logger.info(
+            "Tested %s cluster(s): %s passed, %s failed, %s timed out, "
+            "%s skipped", len(results), outcomes.count("passed"),
+            outcomes.count("failed"), outcomes.count("timeout"),
+            outcomes.count("skipped"),
+            extra={"stage": "controller",
+                   "outcomes": {key: result["outcome"]
+                                for key, result in self.results.items()}})
+        return self.results
+
+    def discover_clusters(self):
+        """ Lists the postgres clusters matching CONTROLLER_LABEL_SELECTOR
+            in every namespace
+
+        Returns:
+            list: (namespace, cluster name) for each cluster
+        """
+        from kubernetes import client
+
+        kube = self.cm.get_kubernetes_connection()
+        custom = client.CustomObjectsApi(kube.api_client)
+        clusters = custom.list_cluster_custom_object(
+            self.group, self.version, self.plural,
+            label_selector=os.getenv('CONTROLLER_LABEL_SELECTOR'))
+        return sorted((item["metadata"]["namespace"],
+                       item["metadata"]["name"])
+                      for item in clusters.get("items", []))
+
+    def get_primary_pod_name(self, namespace, cluster):
+        """ Gets the name of the cluster's primary data pod
+
+        Args:
+            namespace (str): The cluster namespace
+            cluster (str): The cluster name
+
+        Returns:
+            str: The primary pod name or None if there is no primary
+        """
+        kube = self.cm.get_kubernetes_connection()
+        labels = '%s,%s=%s' % (self.primary_label, self.cluster_label,
+                               cluster)
+        pods = kube.list_namespaced_pod(namespace=namespace,
+                                        label_selector=labels)
+        for pod in pods.items:
+            return pod.metadata.name
+        return None
+
+    def get_credentials(self, namespace, cluster):
+        """ Reads the database user and password from the cluster's
+            <cluster>-pguser-<DB_USER> secret
+
+        Args:
+            namespace (str): The cluster namespace
+            cluster (str): The cluster name
+
+        Returns:
+            tuple: The user and password
+        """
+        kube = self.cm.get_kubernetes_connection()
+        secret = kube.read_namespaced_secret(
+            '%s-pguser-%s' % (cluster, os.getenv('DB_USER')), namespace)
+        return tuple(base64.b64decode(secret.data[key]).decode()
+                     for key in ('user', 'password'))
+
+    def get_cluster_environment(self, namespace, cluster, primary_pod,
+                                result_path):
+        """ Builds the environment of a child test run. Each cluster gets
+            its own log directory and run history. Metrics and auto-promote
+            are turned off in the children.
+
+        Args:
+            namespace (str): The cluster namespace
+            cluster (str): The cluster name
+            primary_pod (str): The primary data pod name
+            result_path (str): Where the child writes its run record
+
+        Returns:
+            dict: The environment variables
+        """
+        user, password = self.get_credentials(namespace, cluster)
+        log_path = os.path.join(os.getenv('LOG_PATH'), namespace, cluster)
+        os.makedirs(log_path, exist_ok=True)
+
+        env = dict(os.environ)
+        env.update({
+            "RUN_MODE": "once",
+            "CLUSTER_NAME": cluster,
+            "NAMESPACE": namespace,
+            "HOSTNAME": primary_pod,
+            "DB_USER": user,
+            "DB_USER_PASSWORD": password,
+            "LOG_PATH": log_path,
+            "RUN_HISTORY_PATH": os.path.join(log_path,
+                                             "self_test_history.jsonl"),
+            "RUN_RESULT_PATH": result_path,
+            "METRICS_ENABLED": "false",
+            "AUTO_PROMOTE": "false"
+        })
+        return env
+
+    def run_cluster(self, namespace, cluster):
+        """ Runs the test pipeline against a cluster's primary data pod
+
+        Args:
+            namespace (str): The cluster namespace
+            cluster (str): The cluster name
+
+        Returns:
+            dict: The outcome, duration and run record of the cluster
+        """
+        result = {"namespace": namespace, "cluster": cluster,
+                  "outcome": "failed", "seconds": 0.0, "run": None}
+        started = time.perf_counter()
+
+        try:
+            primary_pod = self.get_primary_pod_name(namespace, cluster)
+            if primary_pod is None:
+                LoggingManager.logger.warning(
+                    "Cluster %s/%s has no primary pod", namespace, cluster,
+                    extra={"stage": "controller", "namespace": namespace,
+                           "cluster": cluster})
+                result["outcome"] = "skipped"
+            else:
+                self.run_child(namespace, cluster, primary_pod, result)
+        except (Exception) as error:
+            LoggingManager.logger.error(error, exc_info=True)
+        finally:
+            result["seconds"] = time.perf_counter() - started
+
+        LoggingManager.logger.info(
+            "Cluster %s/%s %s in %.3f seconds", namespace, cluster,
+            result["outcome"], result["seconds"],
+            extra={"stage": "controller", "namespace": namespace,
+                   "cluster": cluster, "outcome": result["outcome"],
+                   "duration_ms": round(result["seconds"] * 1000, 3)})
+        return result
+
+    def run_child(self, namespace, cluster, primary_pod, result):
+        """ Runs the test pipeline in a child process and stops it once
+            CLUSTER_BUDGET seconds have passed
+
+        Args:
+            namespace (str): The cluster namespace
+            cluster (str): The cluster name
+            primary_pod (str): The primary data pod name
+            result (dict): Receives the outcome and run record
+        """
+        budget = float(os.getenv('CLUSTER_BUDGET'))
+        result_path = os.path.join(os.getenv('LOG_PATH'), namespace,
+                                   cluster, 'self_test_result.json')
+        env = self.get_cluster_environment(namespace, cluster, primary_pod,
+                                           result_path)
+        if os.path.exists(result_path):
+            os.remove(result_path)
+
+        runner = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'test_runner.py')
+        child = subprocess.Popen([sys.executable, runner], env=env,
+                                 stdout=subprocess.DEVNULL,
+                                 stderr=subprocess.DEVNULL)
+        try:
+            exit_code = child.wait(timeout=budget)
+        except subprocess.TimeoutExpired:
+            # let the child clean up its test objects before killing it
+            child.send_signal(signal.SIGTERM)
+            try:
+                child.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                child.kill()
+                child.wait()
+            exit_code = None
+
+        if exit_code is None:
+            result["outcome"] = "timeout"
+        elif exit_code == EXIT_NOT_PRIMARY:
+            result["outcome"] = "skipped"
+        elif exit_code == 0:
+            result["outcome"] = "passed"
+
+        if os.path.exists(result_path):
+            with open(result_path) as result_file:
+                result["run"] = json.load(result_file)
@@ -1,77 +1,444 @@
 """Contains the Database Manager Class
 """
+import os
+import time
 from psycopg2 import sql
 from logging_manager import LoggingManager
+from test_data_stream import TestDataStream
+from trace_manager import TraceManager
 
 
 class DatabaseManager:
     """Creates and cleans up test objects
     """
 
-    # initialize globals
-    lm = LoggingManager()
-
+    @TraceManager.traced
     def create_database(self, cur):
-        """ Creates the test database
+        """ Creates the test database for the configured fixture mode.
+            database creates test_db for each run. schema reuses test_db
+            when it exists. template clones test_db from the test data
+            template when it exists and matches the test data settings.
 
         Args:
             cur connection.cursor: The postgres db connection cursor
         """
         # set db name
         dbname = sql.Identifier('test_db')
+        self.cloned_from_template = False
+        self.building_template = False
+        self.template_loaded = False
+
+        # reuse the test database between schema mode runs
+        if self.fixture_mode == 'schema' and \
+                self.database_exists(cur, 'test_db'):
+            LoggingManager.logger.info("Reusing test database",
+                                       extra={"stage": "create_database"})
+            return
+
+        # clone the test database from the template
+        if self.fixture_mode == 'template':
+            if self.is_template_current(cur):
+                LoggingManager.logger.info(
+                    "Cloning test database from %s", self.template_name,
+                    extra={"stage": "create_database"})
+                cur.execute(sql.SQL('CREATE DATABASE {} TEMPLATE {}').format(
+                    dbname, sql.Identifier(self.template_name)))
+                self.cloned_from_template = True
+                return
+
+            # the test database of this run becomes the new template
+            self.drop_template(cur)
+            self.building_template = True
 
         # commands to create database and assign privileges
-        LoggingManager.logger.info("Creating test database")
+        LoggingManager.logger.info("Creating test database",
+                                   extra={"stage": "create_database"})
         create_cmd = sql.SQL('CREATE DATABASE {}').format(dbname)
         cur.execute(create_cmd)
 
-        LoggingManager.logger.info("Assigning test_db privileges to test_user")
+        LoggingManager.logger.info("Assigning test_db privileges to test_user",
+                                   extra={"stage": "create_database"})
         grant_cmd = sql.SQL('GRANT ALL PRIVILEGES ON DATABASE {} \
           TO test_user').format(dbname)
         cur.execute(grant_cmd)
 
+    # provides the name of the test data template database
+    template_name = 'test_db_template'
+
+    # provides the fixture state of the current run
+    cloned_from_template = False
+    building_template = False
+    template_loaded = False
+
+    def mark_template_loaded(self):
+        """ Marks the test data of a template building run as loaded and
+            validated on the primary so cleanup saves it as the template
+        """
+        self.template_loaded = self.building_template
+
+    # provides the configured fixture mode
+    @property
+    def fixture_mode(self):
+        """ How test fixtures are provisioned for each run
+
+        Returns:
+            str: database, schema or template
+        """
+        return os.getenv('FIXTURE_MODE').lower()
+
+    # provides the test data settings stored on the template
+    @property
+    def template_signature(self):
+        """ The test data settings the template database was loaded with
+
+        Returns:
+            str: The row count, row width and table count
+        """
+        return 'rows=%s width=%s tables=%s' % (
+            self.row_count, self.row_width, len(self.table_names))
+
+    def database_exists(self, cur, dbname):
+        """ Determines if a database exists
+
+        Args:
+            cur connection.cursor: The postgres db connection cursor
+            dbname (str): The database name
+
+        Returns:
+            bool: True if the database exists
+        """
+        cur.execute('SELECT 1 FROM pg_database WHERE datname = %s',
+                    (dbname,))
+        return cur.fetchone() is not None
+
+    def is_template_current(self, cur):
+        """ Determines if the template database exists and was loaded
+            with the current test data settings
+
+        Args:
+            cur connection.cursor: The postgres db connection cursor
+
+        Returns:
+            bool: True if the template can be cloned
+        """
+        cur.execute("SELECT shobj_description(oid, 'pg_database') "
+                    "FROM pg_database WHERE datname = %s",
+                    (self.template_name,))
+        row = cur.fetchone()
+        return row is not None and row[0] == self.template_signature
+
+    def drop_template(self, cur):
+        """ Drops the template database if it exists
+
+        Args:
+            cur connection.cursor: The postgres db connection cursor
+        """
+        if not self.database_exists(cur, self.template_name):
+            return
+
+        LoggingManager.logger.info("Dropping outdated %s",
+                                   self.template_name,
+                                   extra={"stage": "create_database"})
+        template = sql.Identifier(self.template_name)
+        cur.execute(sql.SQL('ALTER DATABASE {} IS_TEMPLATE false')
+                    .format(template))
+        cur.execute(sql.SQL('DROP DATABASE {}').format(template))
+
+    def use_run_schema(self, run_id):
+        """ Sets the test schema name for the run. Schema mode runs use a
+            schema of their own so the test database can be reused.
+
+        Args:
+            run_id (str): The id of the test run
+        """
+        if self.fixture_mode == 'schema':
+            DatabaseManager.schema_name = 'test_schema_%s' % (run_id[:12])
+        else:
+            DatabaseManager.schema_name = 'test_schema'
+
+    # provides the test schema name
+    schema_name = 'test_schema'
+
+    # provides the load throughput of the last create_table call
+    load_stats = {}
+
+    # provides the configured rows per test table
+    @property
+    def row_count(self):
+        """ The number of rows loaded into each test table
+
+        Returns:
+            int: The configured row count
+        """
+        return int(os.getenv('TEST_ROW_COUNT'))
+
+    # provides the configured payload width
+    @property
+    def row_width(self):
+        """ The number of payload characters in each test row
+
+        Returns:
+            int: The configured row width
+        """
+        return int(os.getenv('TEST_ROW_WIDTH'))
+
+    # provides the test table names
+    @property
+    def table_names(self):
+        """ The names of the test tables in the test schema
+
+        Returns:
+            list: test_table followed by test_table_2 ... test_table_n
+        """
+        table_count = max(1, int(os.getenv('TEST_TABLE_COUNT')))
+        return ['test_table'] + ['test_table_%d' % (i)
+                                 for i in range(2, table_count + 1)]
+
     # create test schema
+    @TraceManager.traced
     def create_schema(self, cur):
         """ Creates the test schema in the test database
 
         Args:
             cur connection.cursor: The test db connection cursor
         """
-        LoggingManager.logger.info("Creating test_schema in test_db")
-        cur.execute('CREATE SCHEMA test_schema')
+        LoggingManager.logger.info("Creating %s in test_db",
+                                   self.schema_name,
+                                   extra={"stage": "create_schema",
+                                          "schema": self.schema_name})
+        cur.execute(sql.SQL('CREATE SCHEMA {}').format(
+            sql.Identifier(self.schema_name)))
 
-    # create table in test schema
+    # create tables in test schema
+    @TraceManager.traced
     def create_table(self, cur):
-        """ Creates the test table with data in the test schema
+        """ Creates the test tables and streams the configured number of
+            rows into each with COPY FROM STDIN
 
         Args:
             cur connection.cursor: The test db connection cursor
+
+        Returns:
+            dict: The rows, bytes, seconds and throughput of the load
         """
+        rows = 0
+        size = 0
+        started = time.perf_counter()
+
+        for table_name in self.table_names:
+            LoggingManager.logger.info(
+                "Creating %s with %s rows of data in %s", table_name,
+                self.row_count, self.schema_name,
+                extra={"stage": "create_table", "table": table_name,
+                       "rows": self.row_count})
+            table = sql.Identifier(self.schema_name, table_name)
+            cur.execute(sql.SQL('CREATE TABLE {} (s bigint, md5 text)')
+                        .format(table))
+
+            # stream the generated rows to the server
+            stream = TestDataStream(self.row_count, self.row_width)
+            copy_cmd = sql.SQL('COPY {} (s, md5) FROM STDIN').format(table)
+            cur.copy_expert(copy_cmd, stream, size=65536)
+            rows += self.row_count
+            size += stream.bytes_read
+
+        seconds = max(time.perf_counter() - started, 1e-9)
+        self.load_stats = {
+            "rows": rows,
+            "bytes": size,
+            "seconds": seconds,
+            "rows_per_second": rows / seconds,
+            "mb_per_second": size / seconds / 1048576
+        }
         LoggingManager.logger.info(
-            "Creating test_table with data in test_schema")
-        cur.execute('CREATE TABLE test_schema.test_table AS SELECT s, \
-          md5(random()::text) FROM generate_Series(1,1000) s')
+            "Loaded %s rows (%.1f MB) in %.3f seconds: "
+            "%.0f rows/s, %.2f MB/s", rows, size / 1048576, seconds,
+            self.load_stats["rows_per_second"],
+            self.load_stats["mb_per_second"],
+            extra={"stage": "create_table",
+                   "duration_ms": round(seconds * 1000, 3),
+                   "outcome": "success", **self.load_stats})
+        return self.load_stats
+
+    # checksum a test table by key range
+    @TraceManager.traced
+    def get_table_checksums(self, cur, table_name, chunk_size):
+        """ Computes an order independent hash of the table for each key
+            range of chunk_size rows. The hashing is done by the server so
+            only one row per key range is returned.
+
+        Args:
+            cur connection.cursor: The test db connection cursor
+            table_name (str): The test table to checksum
+            chunk_size (int): The number of keys in each key range
+
+        Returns:
+            dict: (row count, hash sum) keyed by key range index
+        """
+        table = sql.Identifier(self.schema_name, table_name)
+        cur.execute(sql.SQL(
+            "SELECT (t.s - 1) / %s, count(*), "
+            "sum(('x' || substr(md5(t.s::text || ':' || t.md5), 1, 15))"
+            "::bit(60)::bigint) FROM {} t GROUP BY 1").format(table),
+            (chunk_size,))
+        return {chunk: (count, int(total))
+                for chunk, count, total in cur.fetchall()}
+
+    # get the current wal position of the primary
+    def get_current_wal_lsn(self, cur):
+        """ Gets the current write-ahead log location on the primary
+
+        Args:
+            cur connection.cursor: The primary db connection cursor
+
+        Returns:
+            str: The current wal LSN
+        """
+        cur.execute('SELECT pg_current_wal_lsn()')
+        lsn = cur.fetchone()[0]
+        LoggingManager.logger.debug("Primary wal LSN: %s", lsn)
+        return lsn
+
+    # determine if a replica has replayed up to a wal position
+    def has_replayed_wal_lsn(self, cur, lsn):
+        """ Determines if the replica has replayed the write-ahead log
+            up to the given location
+
+        Args:
+            cur connection.cursor: The replica db connection cursor
+            lsn (str): The target wal LSN
+
+        Returns:
+            bool: True if the replica has replayed past the LSN
+        """
+        cur.execute('SELECT pg_last_wal_replay_lsn() >= %s::pg_lsn', (lsn,))
+        return cur.fetchone()[0] is True
+
+    # drop leftovers of runs that did not finish
+    @TraceManager.traced
+    def reconcile_postgres_db_objects(self, cur):
+        """ Drops the test database and user left behind by a run that did
+            not reach its cleanup, after terminating their backends. The
+            objects the fixture mode keeps between runs are left in place.
+
+        Args:
+            cur connection.cursor: The postgres db connection cursor
+        """
+        if self.fixture_mode == 'schema':
+            return
+
+        # the backends are terminated by WITH (FORCE)
+        if self.database_exists(cur, 'test_db'):
+            LoggingManager.logger.warning(
+                "Dropping test_db left by an earlier run",
+                extra={"stage": "reconcile"})
+            cur.execute('DROP DATABASE IF EXISTS test_db WITH (FORCE)')
+
+        if self.fixture_mode != 'database':
+            return
+
+        for role in ('test_user', 'test_storm_user'):
+            cur.execute("SELECT 1 FROM pg_roles WHERE rolname = %s",
+                        (role,))
+            if cur.fetchone() is None:
+                continue
+            LoggingManager.logger.warning(
+                "Dropping %s left by an earlier run", role,
+                extra={"stage": "reconcile"})
+            cur.execute("SELECT pg_terminate_backend(pid) "
+                        "FROM pg_stat_activity WHERE usename = %s "
+                        "AND pid <> pg_backend_pid()", (role,))
+            cur.execute(sql.SQL('DROP ROLE IF EXISTS {}').format(
+                sql.Identifier(role)))
+
+    # drop schemas of schema mode runs that did not finish
+    @TraceManager.traced
+    def reconcile_test_db_objects(self, cur):
+        """ Drops the test schemas left behind by schema mode runs that did
+            not reach their cleanup in one statement
+
+        Args:
+            cur connection.cursor: The test db connection cursor
+        """
+        if self.fixture_mode != 'schema':
+            return
+
+        cur.execute("SELECT nspname FROM pg_namespace "
+                    "WHERE nspname LIKE 'test\\_schema\\_%%' "
+                    "AND nspname <> %s", (self.schema_name,))
+        schemas = [row[0] for row in cur.fetchall()]
+        if not schemas:
+            return
+
+        LoggingManager.logger.warning(
+            "Dropping %s schemas left by earlier runs", len(schemas),
+            extra={"stage": "reconcile", "schemas": schemas})
+        cur.execute(sql.SQL('DROP SCHEMA IF EXISTS {} CASCADE').format(
+            sql.SQL(', ').join(sql.Identifier(schema)
+                               for schema in schemas)))
 
     # clean up objects created with test_user
+    @TraceManager.traced
     def cleanup_test_db_objects(self, cur):
-        """ Drops the test table and schema in the test database
+        """ Drops the test schema and its tables in one statement. Only
+            schema mode runs need this, the other modes drop the whole
+            test database.
 
         Args:
             cur connection.cursor: The test db connection cursor
         """
-        LoggingManager.logger.info("Dropping test_table")
-        cur.execute('DROP TABLE test_schema.test_table')
-        LoggingManager.logger.info("Dropping test_schema")
-        cur.execute('DROP SCHEMA test_schema')
+        if self.fixture_mode != 'schema':
+            return
+
+        LoggingManager.logger.info("Dropping %s", self.schema_name,
+                                   extra={"stage": "cleanup",
+                                          "schema": self.schema_name})
+        cur.execute(sql.SQL('DROP SCHEMA IF EXISTS {} CASCADE').format(
+            sql.Identifier(self.schema_name)))
 
     # clean up objects created with db user
+    @TraceManager.traced
     def cleanup_postgres_db_objects(self, cur):
-        """ Drops the test database and user
+        """ Drops the test database and user. Schema mode keeps both for
+            the next run. Template mode keeps the user, which owns the
+            template, and turns a newly loaded and validated test database
+            into the template.
 
         Args:
             cur connection.cursor: The postgres db connection cursor
         """
-        LoggingManager.logger.info("Dropping test_db")
-        cur.execute('DROP DATABASE test_db')
-        LoggingManager.logger.info("Dropping test_user")
-        cur.execute('DROP ROLE test_user')
+        if self.fixture_mode == 'schema':
+            return
+
+        building_template = self.building_template
+        self.building_template = False
+        if building_template and self.template_loaded:
+            self.template_loaded = False
+            LoggingManager.logger.info("Saving test_db as %s",
+                                       self.template_name,
+                                       extra={"stage": "cleanup"})
+            template = sql.Identifier(self.template_name)
+            cur.execute(sql.SQL('ALTER DATABASE test_db RENAME TO {}')
+                        .format(template))
+            cur.execute(sql.SQL('ALTER DATABASE {} IS_TEMPLATE true')
+                        .format(template))
+            cur.execute(sql.SQL('COMMENT ON DATABASE {} IS {}').format(
+                template, sql.Literal(self.template_signature)))
+            return
+
+        # a partial load must not be cloned by later runs
+        if building_template:
+            LoggingManager.logger.warning(
+                "Not saving test_db as %s because the test data was not "
+                "loaded and validated", self.template_name,
+                extra={"stage": "cleanup", "outcome": "failure"})
+
+        LoggingManager.logger.info("Dropping test_db",
+                                   extra={"stage": "cleanup"})
+        cur.execute('DROP DATABASE IF EXISTS test_db')
+
+        if self.fixture_mode == 'database':
+            LoggingManager.logger.info("Dropping test_user",
+                                       extra={"stage": "cleanup"})
+            cur.execute('DROP ROLE test_user')
+            cur.execute('DROP ROLE IF EXISTS test_storm_user')
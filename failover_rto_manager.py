@@ -0,0 +1,295 @@
+"""Contains the FailoverRtoManager class
+"""
+import os
+import psycopg2
+import threading
+import time
+from config_manager import ConfigManager
+from db_connection_type import DBConnectionType
+from logging_manager import LoggingManager
+from metrics_manager import MetricsManager
+from pod_cache import PodCache
+from psycopg2 import sql
+
+# the number of measured failovers kept in memory
+MAX_EVENTS = 20
+
+# the table each sidecar writes its heartbeat row to in the postgres db
+HEARTBEAT_TABLE = 'self_test_rto_heartbeat'
+
+
+class FailoverRtoManager:
+    """Measures failover recovery times. A write probe through the primary
+    service and a read probe through the replica service run at a high
+    frequency in the background. An outage or a move of the primary role
+    label opens a failover event, which closes once writes and reads
+    succeed again and reports how long each was unavailable.
+    """
+
+    # provides the measured failovers, newest last
+    events = []
+
+    def __init__(self):
+        """ Initializes the managers and the probe state
+        """
+        self.cfm = ConfigManager()
+        self.mm = MetricsManager()
+        self.pc = PodCache()
+        self.lock = threading.Lock()
+        self.interval = float(os.getenv('FAILOVER_RTO_INTERVAL'))
+        self.settle = float(os.getenv('FAILOVER_RTO_SETTLE'))
+        self.timeout = float(os.getenv('FAILOVER_RTO_TIMEOUT'))
+        self.paths = {path: {"up": None, "last_success": None}
+                      for path in ('write', 'read')}
+        self.primary = None
+        self.event = None
+
+    def start(self):
+        """ Starts the write and read probes and listens for role label
+            changes in the pod cache
+        """
+        primaries = self.pc.get_pods_by_role('master')
+        self.primary = primaries[0].metadata.name if primaries else None
+        self.pc.add_listener(self.on_pod_event)
+
+        LoggingManager.logger.info(
+            "Measuring failover recovery times with probes every %s "
+            "seconds. Primary pod: %s", self.interval, self.primary,
+            extra={"stage": "failover_rto"})
+        # the write probe commits a single row so a primary that cannot
+        # commit counts as down
+        pod = os.getenv('HOSTNAME')
+        write = sql.SQL(
+            'INSERT INTO {} (pod, ts) VALUES ({}, now()) '
+            'ON CONFLICT (pod) DO UPDATE SET ts = now()').format(
+                sql.Identifier(HEARTBEAT_TABLE), sql.Literal(pod))
+        for path, connection_type, query in (
+                ('write', DBConnectionType.PRIMARY_SERVICE, write),
+                ('read', DBConnectionType.REPLICA_SERVICE, 'SELECT 1')):
+            threading.Thread(target=self.run_probe,
+                             args=(path, connection_type, query),
+                             name='rto-' + path, daemon=True).start()
+
+    def get_probe_parameters(self, DBConnectionType, timeout):
+        """ Gets postgres database connection parameters that give up on
+            an unreachable server or a stalled statement within timeout
+
+        Args:
+            DBConnectionType (Enum): The service to probe
+            timeout (int): The probe timeout in seconds
+
+        Returns:
+            dictionary: The connection string parameters
+        """
+        params = self.cfm.get_postgres_connection_parameters(
+            DBConnectionType)
+        params["connect_timeout"] = timeout
+        # notice a dead server on an open connection quickly
+        params["keepalives_idle"] = 1
+        params["keepalives_interval"] = 1
+        params["keepalives_count"] = timeout
+        params["tcp_user_timeout"] = timeout * 1000
+        params["options"] = '-c statement_timeout=%s' % (timeout * 1000)
+        return params
+
+    def run_probe(self, path, DBConnectionType, query):
+        """ Runs the probe query every FAILOVER_RTO_INTERVAL seconds until
+            the process exits. The connection is kept open and reopened
+            after a failure.
+
+        Args:
+            path (str): write or read
+            DBConnectionType (Enum): The service to probe
+            query (str or sql.Composed): The probe statement
+        """
+        timeout = int(os.getenv('FAILOVER_RTO_CONNECT_TIMEOUT'))
+        params = self.get_probe_parameters(DBConnectionType, timeout)
+        conn = None
+        next_probe = time.perf_counter()
+
+        while True:
+            try:
+                if conn is None:
+                    conn = psycopg2.connect(**params)
+                    conn.autocommit = True
+                    if path == 'write':
+                        self.create_heartbeat_table(conn)
+                started = time.perf_counter()
+                with conn.cursor() as cur:
+                    cur.execute(query)
+                seconds = time.perf_counter() - started
+                self.mm.record_failover_probe(path, seconds)
+                # a commit cancelled while it waits for a synchronous
+                # standby only warns, so a stalled write is a failure
+                if seconds >= timeout:
+                    raise psycopg2.OperationalError(
+                        "%s probe took %.3f seconds" % (path, seconds))
+                self.record(path, True)
+            except (Exception) as error:
+                LoggingManager.logger.debug(
+                    "Failover %s probe failed: %s", path, str(error).strip())
+                self.record(path, False)
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except (Exception, psycopg2.DatabaseError):
+                        pass
+                    conn = None
+
+            # a hung probe does not cause a burst of probes afterwards
+            next_probe = max(next_probe + self.interval,
+                             time.perf_counter())
+            time.sleep(next_probe - time.perf_counter())
+
+    @staticmethod
+    def create_heartbeat_table(conn):
+        """ Creates the heartbeat table of the write probe if it is missing
+
+        Args:
+            conn (psycopg2.connection): The write probe connection
+        """
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL(
+                'CREATE TABLE IF NOT EXISTS {} (pod text PRIMARY KEY, '
+                'ts timestamptz NOT NULL)').format(
+                    sql.Identifier(HEARTBEAT_TABLE)))
+
+    def record(self, path, succeeded):
+        """ Records a probe outcome and opens or closes a failover event
+
+        Args:
+            path (str): write or read
+            succeeded (bool): True if the probe query succeeded
+        """
+        now = time.time()
+        with self.lock:
+            state = self.paths[path]
+            was_up = state["up"]
+            state["up"] = succeeded
+
+            if succeeded:
+                state["last_success"] = now
+                if self.event is not None and \
+                        self.event["first_%s_after" % path] is None and \
+                        (was_up is False or path == 'write'
+                         and self.event["label_moved"] is not None):
+                    self.event["first_%s_after" % path] = now
+            elif was_up is not False:
+                # the first failure of an outage
+                if self.event is None and path == 'write':
+                    self.open_event(now)
+                if self.event is not None and \
+                        self.event["last_%s_before" % path] is None:
+                    self.event["last_%s_before" % path] = \
+                        state["last_success"]
+
+            if self.event is not None:
+                self.check_event(now)
+
+    def on_pod_event(self, event_type, pod):
+        """ Records the moment the primary role label moves to another pod
+
+        Args:
+            event_type (str): ADDED, MODIFIED or DELETED
+            pod (kubernetes.client.models.v1_pod): The changed pod
+        """
+        role = (pod.metadata.labels or {}).get(self.pc.role_label)
+        if event_type == 'DELETED' or role != 'master' or \
+                pod.metadata.name == self.primary:
+            return
+
+        now = time.time()
+        with self.lock:
+            LoggingManager.logger.info(
+                "The primary role label moved from %s to %s",
+                self.primary, pod.metadata.name,
+                extra={"stage": "failover_rto", "outcome": "label_moved"})
+            if self.event is None:
+                self.open_event(now)
+            self.event["label_moved"] = now
+            self.event["from_pod"] = self.primary
+            self.event["to_pod"] = pod.metadata.name
+            self.primary = pod.metadata.name
+
+    def open_event(self, now):
+        """ Opens a failover event. The caller must hold the lock.
+
+        Args:
+            now (float): The unix time of the first sign of the failover
+        """
+        self.event = {"started": now, "label_moved": None,
+                      "from_pod": None, "to_pod": None,
+                      "last_write_before": None, "first_write_after": None,
+                      "last_read_before": None, "first_read_after": None}
+        if self.paths["write"]["up"] is not False:
+            self.event["last_write_before"] = \
+                self.paths["write"]["last_success"]
+
+    def check_event(self, now):
+        """ Closes the open failover event once writes succeed again,
+            reads have recovered from any outage and the role label had
+            time to move, or once FAILOVER_RTO_TIMEOUT has passed. The
+            caller must hold the lock.
+
+        Args:
+            now (float): The current unix time
+        """
+        event = self.event
+        write_recovered = event["first_write_after"] is not None
+        read_recovered = event["last_read_before"] is None or \
+            event["first_read_after"] is not None
+        # writes can resume before the label move reaches the pod cache
+        label_settled = event["label_moved"] is not None or \
+            (write_recovered and now - event["first_write_after"]
+             > self.settle)
+        timed_out = now - event["started"] > self.timeout
+
+        if (write_recovered and read_recovered and label_settled) or \
+                timed_out:
+            self.event = None
+            self.report_event(event, write_recovered and read_recovered)
+
+    def report_event(self, event, completed):
+        """ Computes, logs and records the unavailability windows of a
+            closed failover event
+
+        Args:
+            event (dict): The closed event
+            completed (bool): False if the event timed out
+        """
+        def window(before, after):
+            if before is None or after is None:
+                return None
+            return round(after - before, 3)
+
+        event["completed"] = completed
+        event["write_unavailable_seconds"] = window(
+            event["last_write_before"], event["first_write_after"])
+        event["read_unavailable_seconds"] = 0.0 \
+            if event["last_read_before"] is None \
+            else window(event["last_read_before"], event["first_read_after"])
+        event["label_moved_after_seconds"] = window(
+            event["last_write_before"], event["label_moved"])
+
+        FailoverRtoManager.events = \
+            (FailoverRtoManager.events + [event])[-MAX_EVENTS:]
+        self.mm.record_failover(event)
+
+        if event["label_moved"] is None:
+            message = "Write outage without a primary change"
+        else:
+            message = "Failover from %s to %s, role label moved %s " \
+                "seconds after the last write" % (
+                    event["from_pod"], event["to_pod"],
+                    event["label_moved_after_seconds"])
+        LoggingManager.logger.info(
+            "%s: writes unavailable for %s seconds, reads unavailable for "
+            "%s seconds", message, event["write_unavailable_seconds"],
+            event["read_unavailable_seconds"],
+            extra=dict(event, stage="failover_rto",
+                       outcome="success" if completed else "timeout"))
+        if not completed:
+            LoggingManager.logger.warning(
+                "Writes or reads did not recover within %s seconds of the "
+                "failover", self.timeout,
+                extra={"stage": "failover_rto", "outcome": "timeout"})
@@ -0,0 +1,71 @@
+"""Contains the FailoverWatcher class
+"""
+import os
+import queue
+from logging_manager import LoggingManager
+from pod_cache import PodCache
+
+
+class FailoverWatcher:
+    """Listens to the pod cache for label changes of the pod the container
+    is running in and reports when it becomes or stops being the primary
+    data pod
+    """
+
+    primary_label = 'postgres-operator.crunchydata.com/role'
+    cluster_label = 'postgres-operator.crunchydata.com/cluster'
+
+    def __init__(self, on_role_changed):
+        """ Initializes the watcher
+
+        Args:
+            on_role_changed (function): Called with True when the pod
+                becomes primary and False when it stops being primary
+        """
+        self.pc = PodCache()
+        self.on_role_changed = on_role_changed
+        self.is_primary = None
+        self.role_changes = queue.Queue()
+
+    def watch(self):
+        """ Reports role changes until the process exits. Changes are
+            queued by the pod cache thread and reported on the calling
+            thread so a test run does not hold up the cache.
+        """
+        host = os.getenv('HOSTNAME')
+        self.pc.add_listener(self.on_pod_event)
+        pod = self.pc.get_pod(host)
+        if pod is not None:
+            self.handle_pod(pod)
+
+        while True:
+            is_primary = self.role_changes.get()
+            self.on_role_changed(is_primary)
+
+    def on_pod_event(self, event_type, pod):
+        """ Handles pod cache events for the pod the container is running in
+
+        Args:
+            event_type (str): ADDED, MODIFIED or DELETED
+            pod (kubernetes.client.models.v1_pod): The changed pod
+        """
+        if pod.metadata.name == os.getenv('HOSTNAME') and \
+                event_type != 'DELETED':
+            self.handle_pod(pod)
+
+    def handle_pod(self, pod):
+        """ Reports a role change if the pod's labels show one
+
+        Args:
+            pod (kubernetes.client.models.v1_pod): The watched pod
+        """
+        labels = pod.metadata.labels or {}
+        is_primary = labels.get(self.primary_label) == 'master' and \
+            labels.get(self.cluster_label) == os.getenv('CLUSTER_NAME')
+
+        if is_primary != self.is_primary:
+            LoggingManager.logger.debug(
+                "Pod %s primary role changed to %s",
+                pod.metadata.name, is_primary)
+            self.is_primary = is_primary
+            self.role_changes.put(is_primary)
@@ -0,0 +1,93 @@
+"""Contains the HealthProbeManager class
+"""
+import time
+from connection_manager import ConnectionManager
+from databases import Databases
+from db_connection_type import DBConnectionType
+from logging_manager import LoggingManager
+from trace_manager import TraceManager
+
+
+class HealthProbeManager:
+    """Checks that the primary service, the replica service and each
+    replica pod accept connections and serve their expected role without
+    creating any test objects
+    """
+
+    # initialize the managers
+    def __init__(self):
+        self.cm = ConnectionManager()
+
+    # provides the results of the last probe keyed by target
+    results = {}
+
+    @TraceManager.traced
+    def run_probe(self, replica_pods, deadline=None):
+        """ Connects to the postgres database of every target and checks
+            whether it is in recovery
+
+        Args:
+            replica_pods (list): The replica pods to probe
+            deadline (float, optional): perf_counter value to stop
+            retrying connections at. Defaults to the retry policy deadline.
+
+        Returns:
+            dict: Success, duration and recovery state by target
+        """
+        targets = [('primary_service', DBConnectionType.PRIMARY_SERVICE,
+                    None, False)]
+        if replica_pods:
+            targets.append(('replica_service',
+                            DBConnectionType.REPLICA_SERVICE, None, True))
+        targets.extend((pod.metadata.name, DBConnectionType.REPLICA_POD,
+                        pod, True) for pod in replica_pods)
+
+        self.results = {
+            name: self.probe_target(name, DBConnectionType, pod,
+                                    expect_recovery, deadline)
+            for name, DBConnectionType, pod, expect_recovery in targets}
+        return self.results
+
+    def probe_target(self, name, DBConnectionType, pod, expect_recovery,
+                     deadline):
+        """ Times a connection and a recovery state query on one target
+
+        Args:
+            name (str): The target name
+            DBConnectionType (Enum): The type of connection
+            pod (kubernetes.client.models.v1_pod): The target replica pod
+            or None for a service
+            expect_recovery (bool): True if the target should be a replica
+            deadline (float): perf_counter value to stop retrying at
+
+        Returns:
+            dict: The success, duration and recovery state of the target
+        """
+        result = {"succeeded": False, "seconds": 0.0, "in_recovery": None}
+        started = time.perf_counter()
+        conn = None
+
+        try:
+            conn = self.cm.get_connection(Databases.POSTGRES,
+                                          DBConnectionType, pod, deadline)
+            with conn.cursor() as cur:
+                cur.execute('SELECT pg_is_in_recovery()')
+                result["in_recovery"] = cur.fetchone()[0]
+            result["succeeded"] = result["in_recovery"] is expect_recovery
+        except (Exception) as error:
+            LoggingManager.logger.error(error, exc_info=True)
+        finally:
+            self.cm.close_connection(conn, Databases.POSTGRES,
+                                     DBConnectionType)
+            result["seconds"] = time.perf_counter() - started
+
+        outcome = 'success' if result["succeeded"] else 'failure'
+        LoggingManager.logger.info(
+            "Probe of %s %s in %.3f seconds, in recovery: %s", name,
+            'succeeded' if result["succeeded"] else 'failed',
+            result["seconds"], result["in_recovery"],
+            extra={"stage": "probe", "target": name,
+                   "connection_type": DBConnectionType.name,
+                   "duration_ms": round(result["seconds"] * 1000, 3),
+                   "outcome": outcome})
+        return result
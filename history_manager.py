@@ -0,0 +1,118 @@
+"""Contains the HistoryManager class
+"""
+import json
+import os
+import statistics
+from logging_manager import LoggingManager
+from run_record import RunRecord
+
+
+class HistoryManager:
+    """Keeps a bounded append-only history of test runs on the pod volume
+    and flags measurements that regressed against a rolling baseline
+    """
+
+    @property
+    def history_path(self):
+        """ The path of the run history file
+
+        Returns:
+            str: The configured history path
+        """
+        return os.getenv('RUN_HISTORY_PATH')
+
+    def load_history(self):
+        """ Loads the stored runs, oldest first
+
+        Returns:
+            list: The stored run records as dictionaries
+        """
+        if not os.path.exists(self.history_path):
+            return []
+
+        records = []
+        with open(self.history_path) as history_file:
+            for line in history_file:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # skip a line truncated by a crash mid-write
+                    continue
+        return records
+
+    def save_run(self, record):
+        """ Appends the run to the history and compacts the file to the
+            newest RUN_HISTORY_MAX_RUNS runs when it grows past the cap
+
+        Args:
+            record (RunRecord): The run to store
+        """
+        max_runs = int(os.getenv('RUN_HISTORY_MAX_RUNS'))
+        history = self.load_history()
+
+        if len(history) + 1 > max_runs:
+            # rewrite atomically so a crash never loses the history
+            history = history[-(max_runs - 1):] if max_runs > 1 else []
+            history.append(record.to_dict())
+            temp_path = self.history_path + ".tmp"
+            with open(temp_path, 'w') as history_file:
+                for item in history:
+                    history_file.write(json.dumps(item) + '\n')
+            os.replace(temp_path, self.history_path)
+        else:
+            with open(self.history_path, 'a') as history_file:
+                history_file.write(json.dumps(record.to_dict()) + '\n')
+
+        LoggingManager.logger.debug("Saved run %s to %s", record.run_id,
+                                    self.history_path)
+
+    def find_regressions(self, record):
+        """ Compares the run with the median of the last
+            RUN_HISTORY_BASELINE_RUNS successful runs and flags measurements
+            that are worse by more than REGRESSION_RATIO
+
+        Args:
+            record (RunRecord): The run to check
+
+        Returns:
+            list: A dictionary for each regressed metric
+        """
+        baseline_runs = int(os.getenv('RUN_HISTORY_BASELINE_RUNS'))
+        ratio = float(os.getenv('REGRESSION_RATIO'))
+        min_seconds = float(os.getenv('REGRESSION_MIN_SECONDS'))
+
+        history = [run for run in self.load_history()
+                   if run.get("succeeded")][-baseline_runs:]
+        if not history:
+            return []
+
+        baselines = {}
+        for run in history:
+            for name, (value, _) in RunRecord.flatten(run).items():
+                baselines.setdefault(name, []).append(value)
+
+        regressions = []
+        for name, (value, higher_is_better) in record.get_metrics().items():
+            if name not in baselines:
+                continue
+            baseline = statistics.median(baselines[name])
+            if higher_is_better:
+                regressed = value * ratio < baseline
+            else:
+                # ignore noise on stages that take almost no time
+                regressed = value > baseline * ratio and \
+                    (not name.startswith(("stage.", "replication"))
+                     or value - baseline > min_seconds)
+            if regressed:
+                regressions.append({"metric": name, "value": value,
+                                    "baseline": baseline,
+                                    "runs": len(baselines[name])})
+                LoggingManager.logger.warning(
+                    "Performance regression in %s: %.3f vs baseline %.3f "
+                    "(median of %s runs)", name, value, baseline,
+                    len(baselines[name]),
+                    extra={"stage": "regression_check", "metric": name,
+                           "value": value, "baseline": baseline,
+                           "outcome": "regressed"})
+
+        return regressions
@@ -0,0 +1,44 @@
+"""Contains the JsonFormatter class
+"""
+import json
+import logging
+
+# attributes every LogRecord has, anything else was passed in extra
+RECORD_ATTRIBUTES = set(logging.LogRecord(
+    '', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats each log record as one JSON object
+    """
+
+    # fields written first and always present
+    context_fields = ('run_id', 'cluster', 'namespace', 'pod', 'stage',
+                      'duration_ms', 'outcome')
+
+    def format(self, record):
+        """ Formats the record as JSON including the context attributes
+            and any fields passed with extra
+
+        Args:
+            record (logging.LogRecord): The record being logged
+
+        Returns:
+            str: The JSON object
+        """
+        event = {
+            "timestamp": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for field in self.context_fields:
+            event[field] = getattr(record, field, None)
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES and key not in event:
+                event[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            event["exception"] = record.exc_text
+        return json.dumps(event, default=str)
@@ -0,0 +1,92 @@
+"""Contains the LatencyHistogram class
+"""
+import math
+
+
+class LatencyHistogram:
+    """Records latencies in exponentially sized buckets so percentiles can
+    be reported in constant memory regardless of the number of samples
+    """
+
+    def __init__(self, lowest=0.00001, growth=1.02):
+        """ Initializes the histogram
+
+        Args:
+            lowest (float, optional): Upper bound in seconds of the first
+            bucket. Defaults to 0.00001.
+            growth (float, optional): Ratio between bucket bounds, which
+            bounds the relative error. Defaults to 1.02.
+        """
+        self.lowest = lowest
+        self.growth = growth
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """ Records a latency sample
+
+        Args:
+            seconds (float): The latency in seconds
+        """
+        if seconds <= self.lowest:
+            index = 0
+        else:
+            index = int(math.log(seconds / self.lowest)
+                        / math.log(self.growth)) + 1
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other):
+        """ Adds the samples of another histogram with the same buckets
+
+        Args:
+            other (LatencyHistogram): The histogram to merge
+        """
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent):
+        """ Gets the latency at or below which the given percent of the
+            samples fall
+
+        Args:
+            percent (float): The percentile, from 0 to 100
+
+        Returns:
+            float: The latency in seconds or None if there are no samples
+        """
+        if self.count == 0:
+            return None
+        rank = math.ceil(self.count * percent / 100)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= max(rank, 1):
+                return min(self.lowest * self.growth ** index, self.max)
+        return self.max
+
+    def summary(self):
+        """ Summarizes the histogram in milliseconds
+
+        Returns:
+            dict: The count, mean, p50, p95, p99 and max latency
+        """
+        def to_ms(seconds):
+            return None if seconds is None else round(seconds * 1000, 3)
+
+        return {
+            "count": self.count,
+            "mean_ms": to_ms(self.total / self.count if self.count
+                             else None),
+            "p50_ms": to_ms(self.percentile(50)),
+            "p95_ms": to_ms(self.percentile(95)),
+            "p99_ms": to_ms(self.percentile(99)),
+            "max_ms": to_ms(self.max if self.count else None)
+        }
@@ -0,0 +1,31 @@
+"""Contains the LogContextFilter class
+"""
+import logging
+import os
+
+
+class LogContextFilter(logging.Filter):
+    """Adds the run id, cluster, namespace and pod to every log record
+    """
+
+    # provides the id of the current test run
+    run_id = None
+
+    def filter(self, record):
+        """ Adds the context attributes to the record. A cluster or
+            namespace passed with extra, such as the cluster a controller
+            is testing, is kept.
+
+        Args:
+            record (logging.LogRecord): The record being logged
+
+        Returns:
+            bool: Always True so the record is logged
+        """
+        record.run_id = LogContextFilter.run_id
+        if not hasattr(record, 'cluster'):
+            record.cluster = os.getenv('CLUSTER_NAME')
+        if not hasattr(record, 'namespace'):
+            record.namespace = os.getenv('NAMESPACE')
+        record.pod = os.getenv('HOSTNAME')
+        return True
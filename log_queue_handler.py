@@ -0,0 +1,33 @@
+"""Contains the LogQueueHandler class
+"""
+import copy
+import logging
+import logging.handlers
+
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    """Queues log records without merging the traceback into the message,
+    so each formatter on the listener thread decides how to write it
+    """
+
+    def prepare(self, record):
+        """ Copies the record with its arguments merged into the message
+            and any traceback formatted into exc_text. The traceback
+            objects are dropped so the queued record holds no frames.
+
+        Args:
+            record (logging.LogRecord): The record being logged
+
+        Returns:
+            logging.LogRecord: The record to queue
+        """
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(
+                    record.exc_info)
+            record.exc_info = None
+        return record
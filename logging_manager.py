@@ -1,66 +1,167 @@
 """Contains the LoggingManager class
 """
+import atexit
+import gzip
 import logging
+import logging.handlers
 import os
+import queue
+import shutil
 import sys
+import uuid
+from json_formatter import JsonFormatter
+from log_context_filter import LogContextFilter
+from log_queue_handler import LogQueueHandler
 
 
 class LoggingManager():
     """Provides a logger that logs to a file, stderr and stdout
     """
 
-    # initialize static logger
-    def __init__(self):
-        if not hasattr(LoggingManager, 'logger'):
-            LoggingManager.logger = self.get_logger()
+    # provides the static logger. It has no handlers until start is called.
+    logger = logging.getLogger('self_test')
 
-    def get_logger(self):
-        """ Creates logger and handlers
+    # provides whether the handlers were added
+    started = False
 
-        Returns:
-            logging.logger: A logger initialized with 3 handlers:
-            stderr, stdout and file handler
+    # provides whether the queue listener thread is running
+    listener_started = False
+
+    def start(self):
+        """ Adds the handlers to the logger. Only the first call has an
+            effect.
+        """
+        if not LoggingManager.started:
+            LoggingManager.started = True
+            self.add_handlers(LoggingManager.logger)
+
+    def add_handlers(self, _logger):
+        """ Creates the handlers. The logger only enqueues records.
+            A queue listener thread writes them to the handlers so log I/O
+            does not block the test threads.
+
+        Args:
+            _logger (logging.logger): The logger that gets a queue handler
+            feeding 3 handlers: stderr, stdout and rotating file handler
         """
-        # create logger
-        _logger = logging.getLogger('self_test')
         log_level = self.get_log_level()
         _logger.setLevel(log_level)
 
         # create formatter and add it to the handlers
-        formatter = logging.Formatter('%(asctime)s - %(name)s - \
+        if os.getenv('LOG_FORMAT').lower() == 'json':
+            formatter = JsonFormatter()
+        else:
+            formatter = logging.Formatter('%(asctime)s - %(name)s - \
           %(levelname)s - %(message)s')
 
-        # create file handler
-        log_path = os.getenv('LOG_PATH') + "/self_test.log"
-        fh = logging.FileHandler(log_path)
+        # create rotating file handler
+        fh = self.get_file_handler()
         fh.setLevel(log_level)
         fh.setFormatter(formatter)
-        _logger.addHandler(fh)
 
         # create a stream handler for stdout
         sh = logging.StreamHandler(stream=sys.stdout)
         sh.setLevel(log_level)
         sh.setFormatter(formatter)
-        _logger.addHandler(sh)
 
         # create a stream handler for stderr
         # only logging errors and above to this handler
         eh = logging.StreamHandler(stream=sys.stderr)
         eh.setLevel(logging.ERROR)
         eh.setFormatter(formatter)
-        _logger.addHandler(eh)
 
-        return _logger
+        # hand records to the listener thread through a queue
+        # the context filter runs on the logging thread
+        # tracebacks stay out of the message for the json formatter
+        log_queue = queue.Queue(-1)
+        qh = LogQueueHandler(log_queue)
+        qh.addFilter(LogContextFilter())
+        _logger.addHandler(qh)
+        LoggingManager.listener = logging.handlers.QueueListener(
+            log_queue, fh, sh, eh, respect_handler_level=True)
+        LoggingManager.listener.start()
+        LoggingManager.listener_started = True
+
+        # flush queued records when the process exits
+        atexit.register(self.remove_handlers, _logger)
+
+    def start_run(self):
+        """ Assigns a new run id that is added to every log record
+
+        Returns:
+            str: The run id
+        """
+        LogContextFilter.run_id = uuid.uuid4().hex
+        return LogContextFilter.run_id
+
+    def get_file_handler(self):
+        """ Creates the self_test.log file handler that rotates by size or
+            time, keeps LOG_BACKUP_COUNT rotated files and optionally
+            compresses them
+
+        Returns:
+            logging.handlers.BaseRotatingHandler: The file handler
+        """
+        log_path = os.getenv('LOG_PATH') + "/self_test.log"
+        backup_count = int(os.getenv('LOG_BACKUP_COUNT'))
+
+        if os.getenv('LOG_ROTATION').lower() == 'time':
+            fh = logging.handlers.TimedRotatingFileHandler(
+                log_path, when=os.getenv('LOG_ROTATE_WHEN'),
+                backupCount=backup_count)
+        else:
+            fh = logging.handlers.RotatingFileHandler(
+                log_path, maxBytes=int(os.getenv('LOG_MAX_BYTES')),
+                backupCount=backup_count)
+
+        # gzip rotated files
+        if os.getenv('LOG_COMPRESS').lower() == 'true':
+            fh.namer = self.get_compressed_name
+            fh.rotator = self.compress_log_file
+
+        return fh
+
+    def get_compressed_name(self, name):
+        """ Names rotated log files with a .gz extension
+
+        Args:
+            name (str): The default rotated file name
+
+        Returns:
+            str: The compressed file name
+        """
+        return name + ".gz"
+
+    def compress_log_file(self, source, dest):
+        """ Compresses the rotated log file and removes the original
+
+        Args:
+            source (str): The log file being rotated
+            dest (str): The compressed file name
+        """
+        with open(source, 'rb') as log_file:
+            with gzip.open(dest, 'wb') as compressed_file:
+                shutil.copyfileobj(log_file, compressed_file)
+        os.remove(source)
 
     def remove_handlers(self, logger):
-        """ Removes handlers from logger
+        """ Flushes queued records, stops the listener thread and then
+            removes and closes the handlers
 
         Args:
             logger (logging.logger): The logger instance that is being closed
         """
-        for handler in logger.handlers:
+        listener = getattr(LoggingManager, 'listener', None)
+        if LoggingManager.listener_started:
+            LoggingManager.listener_started = False
+            listener.stop()
+
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
             handler.close()
-            logger.removeFilter(handler)
+        if listener is not None:
+            for handler in listener.handlers:
+                handler.close()
 
     def get_log_level(self):
         """ Sets logging level enum based on configured value
@@ -0,0 +1,370 @@
+"""Contains the MetricsManager class
+"""
+import os
+import time
+from contextlib import contextmanager
+from logging_manager import LoggingManager
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+# buckets in seconds from sub-millisecond queries to slow syncs
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5,
+                    5, 10, 30, 60, 120, 300)
+
+
+class MetricsManager:
+    """Exposes test stage timings and results as Prometheus metrics
+    """
+
+    # the endpoint is started by the entry point, not at import
+    server_started = False
+
+    # initialize static metrics
+    stage_duration = Histogram(
+        'self_test_stage_duration_seconds',
+        'Duration of each test stage', ['stage'], buckets=DURATION_BUCKETS)
+    stage_failures = Counter(
+        'self_test_stage_failures_total',
+        'Number of test stages that raised an error', ['stage'])
+    connect_attempts = Counter(
+        'self_test_connect_attempts_total',
+        'Number of database connection attempts',
+        ['connection_type', 'outcome'])
+    connect_retries = Counter(
+        'self_test_connect_retries_total',
+        'Number of database connection attempts that were retried',
+        ['connection_type'])
+    connect_duration = Histogram(
+        'self_test_connect_duration_seconds',
+        'Duration of database connection attempts', ['connection_type'],
+        buckets=DURATION_BUCKETS)
+    replication_catch_up = Gauge(
+        'self_test_replication_catch_up_seconds',
+        'Seconds for the replica pod to replay the test data', ['pod'])
+    replication_timeouts = Counter(
+        'self_test_replication_timeouts_total',
+        'Number of times the replica pod did not replay the test data in '
+        'time', ['pod'])
+    replica_validation_duration = Gauge(
+        'self_test_replica_validation_seconds',
+        'Duration of the last replica pod validation', ['pod'])
+    replica_validation_success = Gauge(
+        'self_test_replica_validation_success',
+        '1 if the last replica pod validation succeeded, else 0', ['pod'])
+    replication_visibility = Gauge(
+        'self_test_replication_visibility_seconds',
+        'Heartbeat visibility latency percentile of the last probe',
+        ['target', 'quantile'])
+    replication_visibility_missed = Gauge(
+        'self_test_replication_visibility_missed',
+        'Heartbeats the last probe did not see before its deadline',
+        ['target'])
+    connection_storm_latency = Gauge(
+        'self_test_connection_storm_latency_seconds',
+        'Connect latency percentile of the last connection storm by phase',
+        ['target', 'phase', 'quantile'])
+    connection_storm_attempts = Gauge(
+        'self_test_connection_storm_attempts',
+        'Connection attempts of the last connection storm by outcome',
+        ['target', 'outcome'])
+    connection_headroom = Gauge(
+        'self_test_connection_headroom',
+        'Free non-reserved connection slots while the last connection '
+        'storm held its connections open', ['target'])
+    tls_connect_latency = Gauge(
+        'self_test_tls_connect_latency_seconds',
+        'Connect latency percentile of the last sslmode benchmark',
+        ['target', 'sslmode', 'quantile'])
+    tls_query_latency = Gauge(
+        'self_test_tls_query_latency_seconds',
+        'Query latency percentile of the last sslmode benchmark',
+        ['target', 'sslmode', 'quantile'])
+    promotion_duration = Gauge(
+        'self_test_promotion_duration_seconds',
+        'Seconds from the last ArgoCD sync request to a synced and '
+        'healthy application or the sync deadline')
+    promotion_success = Gauge(
+        'self_test_promotion_success',
+        '1 if the last ArgoCD sync finished synced and healthy, else 0')
+    cluster_run_success = Gauge(
+        'self_test_cluster_run_success',
+        '1 if the last controller test run of the cluster passed, else 0',
+        ['namespace', 'cluster'])
+    cluster_run_duration = Gauge(
+        'self_test_cluster_run_duration_seconds',
+        'Duration of the last controller test run of the cluster',
+        ['namespace', 'cluster'])
+    scheduled_runs = Counter(
+        'self_test_scheduled_runs_total',
+        'Number of scheduled test runs by outcome', ['outcome'])
+    scheduled_run_duration = Gauge(
+        'self_test_scheduled_run_duration_seconds',
+        'Duration of the last scheduled full or probe run', ['kind'])
+    probe_success = Gauge(
+        'self_test_probe_success',
+        '1 if the target answered the last probe run with its expected '
+        'role, else 0', ['target'])
+    probe_duration = Gauge(
+        'self_test_probe_duration_seconds',
+        'Seconds to connect to the target and query its role in the last '
+        'probe run', ['target'])
+    failover_probe_duration = Histogram(
+        'self_test_failover_probe_duration_seconds',
+        'Duration of the failover write and read probes', ['path'],
+        buckets=DURATION_BUCKETS)
+    failovers = Counter(
+        'self_test_failovers_total',
+        'Number of measured failovers and write outages by outcome',
+        ['outcome'])
+    failover_write_unavailable = Gauge(
+        'self_test_failover_write_unavailable_seconds',
+        'Seconds from the last write before the last failover to the '
+        'first write after it')
+    failover_read_unavailable = Gauge(
+        'self_test_failover_read_unavailable_seconds',
+        'Seconds from the last read before the last failover to the first '
+        'read after it, 0 if reads never failed')
+    failover_label_move = Gauge(
+        'self_test_failover_label_move_seconds',
+        'Seconds from the last write before the last failover to the move '
+        'of the primary role label')
+    time_to_first_test = Gauge(
+        'self_test_time_to_first_test_seconds',
+        'Seconds from the container process start to the first test')
+    last_run_success = Gauge(
+        'self_test_last_run_success',
+        '1 if the last test run succeeded, else 0')
+    last_run_timestamp = Gauge(
+        'self_test_last_run_timestamp_seconds',
+        'Unix time the last test run finished')
+
+    def start_server(self):
+        """ Starts the metrics HTTP endpoint once if enabled
+
+        Returns:
+            bool: True if the endpoint is running
+        """
+        if MetricsManager.server_started or \
+                os.getenv('METRICS_ENABLED').lower() != 'true':
+            return MetricsManager.server_started
+
+        port = int(os.getenv('METRICS_PORT'))
+        start_http_server(port)
+        MetricsManager.server_started = True
+        LoggingManager.logger.debug("Serving metrics on port %s", port)
+        return True
+
+    @contextmanager
+    def time_stage(self, stage):
+        """ Times a test stage and counts it as failed if it raises
+
+        Args:
+            stage (str): The name of the stage
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        except (Exception):
+            MetricsManager.stage_failures.labels(stage).inc()
+            raise
+        finally:
+            MetricsManager.stage_duration.labels(stage).observe(
+                time.perf_counter() - started)
+
+    def record_connect_attempt(self, DBConnectionType, duration, succeeded):
+        """ Records the outcome and latency of a connection attempt
+
+        Args:
+            DBConnectionType (Enum): The type of connection
+            duration (float): The seconds the attempt took
+            succeeded (bool): True if the connection was established
+        """
+        connection_type = DBConnectionType.name.lower()
+        outcome = 'success' if succeeded else 'failure'
+        MetricsManager.connect_attempts.labels(connection_type,
+                                               outcome).inc()
+        MetricsManager.connect_duration.labels(connection_type).observe(
+            duration)
+
+    def record_connect_retry(self, DBConnectionType):
+        """ Counts a connection attempt that is retried
+
+        Args:
+            DBConnectionType (Enum): The type of connection
+        """
+        MetricsManager.connect_retries.labels(
+            DBConnectionType.name.lower()).inc()
+
+    def record_catch_up_times(self, catch_up_times):
+        """ Records the replication catch-up time of each replica pod
+
+        Args:
+            catch_up_times (dict): Seconds or None keyed by pod name
+        """
+        for pod_name, duration in catch_up_times.items():
+            if duration is None:
+                MetricsManager.replication_timeouts.labels(pod_name).inc()
+            else:
+                MetricsManager.replication_catch_up.labels(pod_name).set(
+                    duration)
+
+    def record_replica_validations(self, results):
+        """ Records the duration and outcome of each replica pod validation
+
+        Args:
+            results (list): ReplicaValidationResult for each replica pod
+        """
+        for result in results:
+            MetricsManager.replica_validation_duration.labels(
+                result.pod_name).set(result.duration)
+            MetricsManager.replica_validation_success.labels(
+                result.pod_name).set(1 if result.succeeded else 0)
+
+    def record_visibility(self, results):
+        """ Records the visibility latency percentiles of each probe target
+
+        Args:
+            results (dict): Probe summaries keyed by target
+        """
+        for target, result in results.items():
+            for quantile in ("p50", "p95", "p99", "max"):
+                value = result[quantile + "_ms"]
+                if value is not None:
+                    MetricsManager.replication_visibility.labels(
+                        target, quantile).set(value / 1000)
+            MetricsManager.replication_visibility_missed.labels(
+                target).set(result["missed"])
+
+    def record_connection_storm(self, results):
+        """ Records the phase latencies, attempt outcomes and headroom of
+            each connection storm target
+
+        Args:
+            results (dict): Storm results keyed by target
+        """
+        for target, result in results.items():
+            for phase in ('tcp', 'tls', 'auth', 'total'):
+                for quantile in ('p50', 'p95', 'p99', 'max'):
+                    value = result[phase][quantile + "_ms"]
+                    if value is not None:
+                        MetricsManager.connection_storm_latency.labels(
+                            target, phase, quantile).set(value / 1000)
+            for outcome in ('connected', 'rejected', 'failed'):
+                MetricsManager.connection_storm_attempts.labels(
+                    target, outcome).set(result[outcome])
+            if result["headroom"] is not None:
+                MetricsManager.connection_headroom.labels(target).set(
+                    result["headroom"])
+
+    def record_tls_benchmark(self, results):
+        """ Records the connect and query latencies of each sslmode and
+            target of the sslmode benchmark
+
+        Args:
+            results (dict): Results by sslmode keyed by target
+        """
+        for target, modes in results.items():
+            for sslmode, result in modes.items():
+                for quantile in ('p50', 'p95', 'p99', 'max'):
+                    connect = result["total"][quantile + "_ms"]
+                    if connect is not None:
+                        MetricsManager.tls_connect_latency.labels(
+                            target, sslmode, quantile).set(connect / 1000)
+                    query = result["query"][quantile + "_ms"]
+                    if query is not None:
+                        MetricsManager.tls_query_latency.labels(
+                            target, sslmode, quantile).set(query / 1000)
+
+    def record_promotion(self, promotion):
+        """ Records the duration and outcome of an ArgoCD promotion
+
+        Args:
+            promotion (dict): The promotion outcome and seconds
+        """
+        MetricsManager.promotion_duration.set(promotion["seconds"])
+        MetricsManager.promotion_success.set(
+            1 if promotion["succeeded"] else 0)
+
+    def record_cluster_run(self, result):
+        """ Records the outcome and duration of a controller test run
+
+        Args:
+            result (dict): The namespace, cluster, outcome and seconds
+        """
+        labels = (result["namespace"], result["cluster"])
+        MetricsManager.cluster_run_success.labels(*labels).set(
+            1 if result["outcome"] == "passed" else 0)
+        MetricsManager.cluster_run_duration.labels(*labels).set(
+            result["seconds"])
+
+    def record_scheduled_run(self, outcome, kind=None, seconds=None):
+        """ Records the outcome of a scheduled run
+
+        Args:
+            outcome (str): passed, failed, over_budget or skipped
+            kind (str, optional): full or probe. Defaults to None.
+            seconds (float, optional): The run duration. Defaults to None.
+        """
+        MetricsManager.scheduled_runs.labels(outcome).inc()
+        if kind is not None and seconds is not None:
+            MetricsManager.scheduled_run_duration.labels(kind).set(seconds)
+
+    def record_probe(self, results):
+        """ Records the outcome and duration of each probe run target
+
+        Args:
+            results (dict): Probe results keyed by target
+        """
+        for target, result in results.items():
+            MetricsManager.probe_success.labels(target).set(
+                1 if result["succeeded"] else 0)
+            MetricsManager.probe_duration.labels(target).set(
+                result["seconds"])
+
+    def record_failover_probe(self, path, seconds):
+        """ Records the duration of a failover probe statement
+
+        Args:
+            path (str): write or read
+            seconds (float): The statement duration
+        """
+        MetricsManager.failover_probe_duration.labels(path).observe(seconds)
+
+    def record_failover(self, event):
+        """ Records the unavailability windows of a measured failover
+
+        Args:
+            event (dict): The closed failover event
+        """
+        if not event["completed"]:
+            outcome = 'timeout'
+        elif event["label_moved"] is None:
+            outcome = 'outage'
+        else:
+            outcome = 'failover'
+        MetricsManager.failovers.labels(outcome).inc()
+        for gauge, seconds in (
+                (MetricsManager.failover_write_unavailable,
+                 event["write_unavailable_seconds"]),
+                (MetricsManager.failover_read_unavailable,
+                 event["read_unavailable_seconds"]),
+                (MetricsManager.failover_label_move,
+                 event["label_moved_after_seconds"])):
+            if seconds is not None:
+                gauge.set(seconds)
+
+    def record_time_to_first_test(self, seconds):
+        """ Records how long the container took to start testing
+
+        Args:
+            seconds (float): Seconds since the process started
+        """
+        MetricsManager.time_to_first_test.set(seconds)
+
+    def record_run(self, succeeded):
+        """ Records the outcome and finish time of a test run
+
+        Args:
+            succeeded (bool): True if all tests passed
+        """
+        MetricsManager.last_run_success.set(1 if succeeded else 0)
+        MetricsManager.last_run_timestamp.set(time.time())
@@ -0,0 +1,99 @@
+"""Contains the PerformanceGate class
+"""
+import os
+
+
+class PerformanceGate:
+    """Evaluates the measurements of a test run against the configured
+    promotion thresholds. A threshold that is not set is not checked.
+    """
+
+    def get_threshold(self, name):
+        """ Gets a threshold from the environment
+
+        Args:
+            name (str): The environment variable name
+
+        Returns:
+            float: The threshold or None if it is not set
+        """
+        value = os.getenv(name)
+        if value is None or value.strip() == "":
+            return None
+        return float(value)
+
+    def evaluate(self, run_record):
+        """ Finds every threshold the run breaches
+
+        Args:
+            run_record (RunRecord): The measurements of the run
+
+        Returns:
+            list: A reason for each breached threshold
+        """
+        reasons = []
+
+        # replication catch-up time of the slowest replica
+        max_catch_up = self.get_threshold('GATE_MAX_REPLICATION_CATCH_UP')
+        if max_catch_up is not None:
+            for pod, seconds in run_record.replication_catch_up.items():
+                if seconds is None:
+                    reasons.append("replica pod %s did not catch up" % (pod))
+                elif seconds > max_catch_up:
+                    reasons.append(
+                        "replica pod %s caught up in %.3f seconds, limit "
+                        "%.3f" % (pod, seconds, max_catch_up))
+
+        # duration of each validation stage
+        max_validation = self.get_threshold('GATE_MAX_VALIDATION_SECONDS')
+        if max_validation is not None:
+            for stage, seconds in run_record.stages.items():
+                if stage.startswith('validate_') and \
+                        seconds > max_validation:
+                    reasons.append("%s took %.3f seconds, limit %.3f"
+                                   % (stage, seconds, max_validation))
+
+        # benchmark throughput and tail latency of each service
+        min_tps = self.get_threshold('GATE_MIN_BENCHMARK_TPS')
+        max_p99 = self.get_threshold('GATE_MAX_BENCHMARK_P99_MS')
+        for service, result in run_record.benchmark.items():
+            if min_tps is not None and result["tps"] < min_tps:
+                reasons.append("%s benchmark ran %.1f TPS, minimum %.1f"
+                               % (service, result["tps"], min_tps))
+            if max_p99 is not None and result["p99_ms"] is not None \
+                    and result["p99_ms"] > max_p99:
+                reasons.append("%s benchmark p99 latency was %.3f ms, "
+                               "limit %.3f" % (service, result["p99_ms"],
+                                               max_p99))
+
+        # connection setup latency, rejections and headroom of each target
+        max_connect_p99 = self.get_threshold('GATE_MAX_CONNECT_P99_MS')
+        max_rejected = self.get_threshold('GATE_MAX_CONNECTION_REJECTIONS')
+        min_headroom = self.get_threshold('GATE_MIN_CONNECTION_HEADROOM')
+        for target, result in run_record.connection_storm.items():
+            p99_ms = result["total"]["p99_ms"]
+            if max_connect_p99 is not None and p99_ms is not None \
+                    and p99_ms > max_connect_p99:
+                reasons.append("%s connect p99 latency was %.3f ms, limit "
+                               "%.3f" % (target, p99_ms, max_connect_p99))
+            if max_rejected is not None and \
+                    result["rejected"] > max_rejected:
+                reasons.append("%s rejected %s connection attempts, limit "
+                               "%d" % (target, result["rejected"],
+                                       max_rejected))
+            if min_headroom is not None and result["headroom"] is not None \
+                    and result["headroom"] < min_headroom:
+                reasons.append("%s had %s free connection slots during the "
+                               "storm, minimum %d" % (target,
+                                                      result["headroom"],
+                                                      min_headroom))
+
+        # regressions against the run history
+        if os.getenv('GATE_BLOCK_ON_REGRESSION').lower() == 'true':
+            for regression in run_record.regressions:
+                reasons.append("%s regressed to %.3f from a baseline of "
+                               "%.3f" % (regression["metric"],
+                                         regression["value"],
+                                         regression["baseline"]))
+
+        return reasons
@@ -0,0 +1,191 @@
+"""Contains the PodCache class
+"""
+import os
+import threading
+import time
+from connection_manager import ConnectionManager
+from logging_manager import LoggingManager
+
+HTTP_STATUS_GONE = 410
+
+
+class PodCache:
+    """Keeps a local view of the postgres cluster's pods current by listing
+    them once and then watching for changes. Pods are indexed by their
+    role label so primary and replica lookups need no API round trips.
+    """
+
+    role_label = 'postgres-operator.crunchydata.com/role'
+    cluster_label = 'postgres-operator.crunchydata.com/cluster'
+
+    # initialize the managers
+    def __init__(self):
+        self.cm = ConnectionManager()
+
+    # initialize the shared cache state
+    pods = {}
+    pods_by_role = {}
+    listeners = []
+    resource_version = None
+    lock = threading.Lock()
+    synced = threading.Event()
+    thread = None
+
+    def start(self):
+        """ Starts the background list and watch once and waits until the
+            cache holds the initial list of pods
+
+        Raises:
+            TimeoutError: If the pods could not be listed in time
+        """
+        with PodCache.lock:
+            if PodCache.thread is None:
+                PodCache.thread = threading.Thread(target=self.run,
+                                                   name='pod-cache',
+                                                   daemon=True)
+                PodCache.thread.start()
+        timeout = int(os.getenv('FAILOVER_WATCH_TIMEOUT'))
+        if not PodCache.synced.wait(timeout):
+            raise TimeoutError("Unable to list the postgres cluster pods")
+
+    def add_listener(self, listener):
+        """ Registers a function called with the event type and pod after
+            each change is applied to the cache
+
+        Args:
+            listener (function): Called with ('ADDED'|'MODIFIED'|'DELETED',
+                kubernetes.client.models.v1_pod)
+        """
+        with PodCache.lock:
+            PodCache.listeners.append(listener)
+
+    def get_pod(self, name):
+        """ Gets a cached pod by name
+
+        Args:
+            name (str): The pod name
+
+        Returns:
+            kubernetes.client.models.v1_pod: The pod or None
+        """
+        self.start()
+        with PodCache.lock:
+            return PodCache.pods.get(name)
+
+    def get_pods_by_role(self, role):
+        """ Gets the cached pods with the given role label
+
+        Args:
+            role (str): The role label value, master or replica
+
+        Returns:
+            list: The pods sorted by name
+        """
+        self.start()
+        with PodCache.lock:
+            pods = PodCache.pods_by_role.get(role, {})
+            return [pods[name] for name in sorted(pods)]
+
+    def run(self):
+        """ Lists the pods of the cluster, then watches them until the
+            process exits. The watch resumes from the last seen
+            resourceVersion after each timeout or dropped connection and
+            the pods are listed again when the resourceVersion expires.
+        """
+        # imported on first use to keep the sidecar startup fast
+        from kubernetes import watch
+        from kubernetes.client.rest import ApiException
+
+        kube = self.cm.get_kubernetes_connection()
+        ns = os.getenv('NAMESPACE')
+        selector = '%s=%s' % (self.cluster_label, os.getenv('CLUSTER_NAME'))
+        timeout = int(os.getenv('FAILOVER_WATCH_TIMEOUT'))
+        reconnect_delay = 1
+
+        while True:
+            try:
+                # list to sync state when there is no
+                # resourceVersion to resume the watch from
+                if PodCache.resource_version is None:
+                    pods = kube.list_namespaced_pod(namespace=ns,
+                                                    label_selector=selector)
+                    self.replace_pods(pods.items)
+                    PodCache.resource_version = \
+                        pods.metadata.resource_version
+                    PodCache.synced.set()
+
+                LoggingManager.logger.debug(
+                    "Watching cluster pods from resourceVersion %s",
+                    PodCache.resource_version)
+                w = watch.Watch()
+                for event in w.stream(kube.list_namespaced_pod,
+                                      namespace=ns,
+                                      label_selector=selector,
+                                      resource_version=PodCache
+                                      .resource_version,
+                                      allow_watch_bookmarks=True,
+                                      timeout_seconds=timeout):
+                    pod = event['object']
+                    PodCache.resource_version = \
+                        pod.metadata.resource_version
+                    if event['type'] in ('ADDED', 'MODIFIED', 'DELETED'):
+                        self.apply_event(event['type'], pod)
+
+                # the server closed the watch, resume from the last event
+                reconnect_delay = 1
+
+            except ApiException as error:
+                if error.status == HTTP_STATUS_GONE:
+                    # the resourceVersion is too old, list again
+                    LoggingManager.logger.debug(
+                        "Watch resourceVersion expired. Relisting pods.")
+                    PodCache.resource_version = None
+                    continue
+                LoggingManager.logger.error(error, exc_info=True)
+                time.sleep(reconnect_delay)
+                reconnect_delay = min(reconnect_delay * 2, 30)
+            except (Exception) as error:
+                LoggingManager.logger.error(error, exc_info=True)
+                time.sleep(reconnect_delay)
+                reconnect_delay = min(reconnect_delay * 2, 30)
+
+    def replace_pods(self, pods):
+        """ Replaces the cache contents with a fresh list of pods and
+            reports the differences to the listeners
+
+        Args:
+            pods (list): The listed pods
+        """
+        listed = {pod.metadata.name: pod for pod in pods}
+        for name in list(PodCache.pods):
+            if name not in listed:
+                self.apply_event('DELETED', PodCache.pods[name])
+        for pod in pods:
+            event_type = 'MODIFIED' if pod.metadata.name in PodCache.pods \
+                else 'ADDED'
+            self.apply_event(event_type, pod)
+
+    def apply_event(self, event_type, pod):
+        """ Updates the pod and role indexes and notifies the listeners
+
+        Args:
+            event_type (str): ADDED, MODIFIED or DELETED
+            pod (kubernetes.client.models.v1_pod): The changed pod
+        """
+        name = pod.metadata.name
+        role = (pod.metadata.labels or {}).get(self.role_label)
+
+        with PodCache.lock:
+            # a role change moves the pod between indexes
+            for pods in PodCache.pods_by_role.values():
+                pods.pop(name, None)
+            if event_type == 'DELETED':
+                PodCache.pods.pop(name, None)
+            else:
+                PodCache.pods[name] = pod
+                if role is not None:
+                    PodCache.pods_by_role.setdefault(role, {})[name] = pod
+            listeners = list(PodCache.listeners)
+
+        for listener in listeners:
+            listener(event_type, pod)
@@ -1,42 +1,115 @@
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from connection_manager import ConnectionManager
+from database_manager import DatabaseManager
+from databases import Databases
+from db_connection_type import DBConnectionType
+from logging_manager import LoggingManager
+from pod_cache import PodCache
+from retry_policy import RetryPolicy
+from trace_manager import TraceManager
 
 
 class ReplicaManager:
 
-    _replica_pod_list = None
-    cm = ConnectionManager()
+    _replica_pod_list = []
+    catch_up_times = {}
+
+    # initialize the managers
+    def __init__(self):
+        self.cm = ConnectionManager()
+        self.dbm = DatabaseManager()
+        self.pc = PodCache()
 
     @property
     def replica_pod_list(self):
-        return self._replica_pod_list.items
+        return self._replica_pod_list
 
     @property
     def has_replicas(self):
         return self.does_postgres_cluster_have_replicas()
 
+    @TraceManager.traced
     def get_replica_pods(self):
-        """ Determine if the container is running replica data pods
+        """ Gets the replica data pods of the cluster from the pod cache.
+            The list is kept for the rest of the test run.
+        """
+        self._replica_pod_list = self.pc.get_pods_by_role('replica')
+
+    def does_postgres_cluster_have_replicas(self):
+        return len(self._replica_pod_list) > 0
+
+    @TraceManager.traced
+    def wait_for_replica_pods(self, lsn):
+        """ Waits for every replica pod to replay the primary wal up to
+            the given LSN or for the configured deadline to pass
+
+        Args:
+            lsn (str): The primary wal LSN the replicas must reach
 
         Returns:
-            bool: True if Replica
+            dict: Catch-up time in seconds keyed by pod name.
+                  The value is None if the pod did not catch up in time.
         """
-        # self.cm.connect_to_kubernetes()
-        kube = ConnectionManager.kubernetes_connection
-        ns = os.getenv('NAMESPACE')
-        cluster_name = os.getenv('CLUSTER_NAME')
-
-        replica_label = 'postgres-operator.crunchydata.com/role=replica'
-        cluster_label = "postgres-operator.crunchydata.com/cluster=%s" \
-            % (cluster_name)
-        labels = replica_label + "," + cluster_label
-        self._replica_pod_list = kube.list_namespaced_pod(
-            namespace=ns, label_selector=labels)
+        timeout = float(os.getenv('REPLICATION_TIMEOUT'))
+        pods = self.replica_pod_list
+        started = time.perf_counter()
+        deadline = started + timeout
 
-    def does_postgres_cluster_have_replicas(self):
-        if self.replica_pod_list is not None:
-            if self._replica_pod_list.items is not None:
-                for pod in self._replica_pod_list.items:
-                    if pod is not None:
-                        return True
-        return False
+        # poll each replica pod concurrently against the same deadline
+        with ThreadPoolExecutor(max_workers=max(1, len(pods))) as executor:
+            durations = list(executor.map(TraceManager.propagate(
+                lambda pod: self.wait_for_replica_pod(pod, lsn, started,
+                                                      deadline)), pods))
+
+        catch_up_times = {}
+        for pod, duration in zip(pods, durations):
+            catch_up_times[pod.metadata.name] = duration
+            if duration is None:
+                LoggingManager.logger.warning(
+                    "Replica pod %s did not replay LSN %s within %s seconds"
+                    % (pod.metadata.name, lsn, timeout))
+            else:
+                LoggingManager.logger.info(
+                    "Replica pod %s caught up to LSN %s in %.3f seconds"
+                    % (pod.metadata.name, lsn, duration))
+
+        self.catch_up_times = catch_up_times
+        return catch_up_times
+
+    @TraceManager.traced
+    def wait_for_replica_pod(self, pod, lsn, started, deadline):
+        """ Polls a replica pod until it has replayed the given LSN
+
+        Args:
+            pod (kubernetes.client.models.v1_pod): The target replica pod
+            lsn (str): The primary wal LSN the replica must reach
+            started (float): perf_counter value the wait started at
+            deadline (float): perf_counter value to stop polling at
+
+        Returns:
+            float: Seconds until the replica caught up or None on timeout
+        """
+        interval = float(os.getenv('REPLICATION_POLL_INTERVAL'))
+        conn = None
+        try:
+            while time.perf_counter() < deadline:
+                # (re)connect until the replica accepts connections and
+                # has replayed the creation of test_db
+                if conn is None:
+                    conn = self.cm.open_replica_pod_test_db_connection(
+                        pod, deadline,
+                        RetryPolicy.is_retryable_replica_connect_error)
+                if conn is not None:
+                    with conn.cursor() as cur:
+                        if self.dbm.has_replayed_wal_lsn(cur, lsn):
+                            return time.perf_counter() - started
+                time.sleep(interval)
+            return None
+        except (Exception) as error:
+            LoggingManager.logger.error(error, exc_info=True)
+            return None
+        finally:
+            self.cm.close_connection(conn, Databases.TEST_DB,
+                                     DBConnectionType.REPLICA_POD)
@@ -0,0 +1,14 @@
+"""Simple class to store the result of a replica pod validation
+"""
+from dataclasses import dataclass
+
+
+@dataclass
+class ReplicaValidationResult:
+    """Stores the outcome and timing of a single replica pod validation
+    """
+
+    pod_name: str
+    succeeded: bool
+    duration: float
+    error: Exception = None
@@ -0,0 +1,163 @@
+"""Contains the RetryPolicy class
+"""
+import psycopg2
+import random
+import time
+from logging_manager import LoggingManager
+
+# sqlstates a connection attempt can succeed after
+# 57P03 cannot_connect_now: the server is starting up or shutting down
+# 53300 too_many_connections
+# 08xxx connection_exception
+RETRYABLE_SQLSTATES = ('57P03', '53300')
+
+# connection errors that another attempt cannot fix
+FATAL_MESSAGES = ('password authentication failed', 'no pg_hba.conf entry',
+                  'does not exist', 'permission denied',
+                  'invalid sslmode value', 'server does not support ssl')
+
+
+class RetryPolicy:
+    """Retries an operation with exponentially growing, fully jittered
+    delays until it succeeds, fails with an error that is not retryable or
+    an overall deadline passes
+    """
+
+    def __init__(self, initial_delay, max_delay, deadline, multiplier=2):
+        """ Initializes the policy
+
+        Args:
+            initial_delay (float): Upper bound in seconds of the first delay
+            max_delay (float): Upper bound in seconds of any delay
+            deadline (float): Seconds after the first attempt to give up
+            multiplier (float, optional): Growth of the delay bound per
+            attempt. Defaults to 2.
+        """
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.multiplier = multiplier
+
+    @staticmethod
+    def is_retryable_connect_error(error):
+        """ Determines if a failed connection attempt can succeed later.
+            A server that is not listening yet, still starting up or out of
+            connections is retryable. Authentication failures and missing
+            databases or roles are fatal.
+
+        Args:
+            error (Exception): The connection error
+
+        Returns:
+            bool: True if the attempt should be retried
+        """
+        # the pool had no free connection in time
+        if isinstance(error, TimeoutError):
+            return True
+        if not isinstance(error, psycopg2.OperationalError):
+            return False
+
+        pgcode = getattr(error, 'pgcode', None)
+        if pgcode:
+            return pgcode in RETRYABLE_SQLSTATES or pgcode.startswith('08')
+
+        # errors raised by libpq while connecting have no sqlstate
+        message = str(error).lower()
+        return not any(fatal in message for fatal in FATAL_MESSAGES)
+
+    @staticmethod
+    def is_retryable_replica_connect_error(error):
+        """ Determines if a failed connection attempt to a replica pod that
+            may still be replaying the creation of its database can succeed
+            later. A missing database is retryable in addition to the
+            errors is_retryable_connect_error retries.
+
+        Args:
+            error (Exception): The connection error
+
+        Returns:
+            bool: True if the attempt should be retried
+        """
+        return RetryPolicy.is_missing_database(error) or \
+            RetryPolicy.is_retryable_connect_error(error)
+
+    @staticmethod
+    def is_missing_database(error):
+        """ Determines if a connection attempt failed because the database
+            does not exist on the server
+
+        Args:
+            error (Exception): The connection error
+
+        Returns:
+            bool: True if the database does not exist
+        """
+        message = str(error).lower()
+        return isinstance(error, psycopg2.OperationalError) and \
+            'database "' in message and 'does not exist' in message
+
+    def get_delay(self, attempt):
+        """ Gets a random delay before the next attempt. The full jitter
+            spreads out clients that failed at the same time.
+
+        Args:
+            attempt (int): The number of attempts made so far
+
+        Returns:
+            float: The delay in seconds
+        """
+        bound = min(self.max_delay,
+                    self.initial_delay * self.multiplier ** (attempt - 1))
+        return random.uniform(0, bound)
+
+    def run(self, operation, is_retryable, description, on_retry=None,
+            deadline=None):
+        """ Runs the operation until it succeeds or must give up
+
+        Args:
+            operation (function): Called without arguments
+            is_retryable (function): Called with the error of a failed
+            attempt, returns True if the operation should be retried
+            description (str): What the operation does, for logging
+            on_retry (function, optional): Called with the attempt number
+            and error before each retry. Defaults to None.
+            deadline (float, optional): perf_counter value to give up at
+            instead of the policy deadline. Defaults to None.
+
+        Raises:
+            Exception: The error of the last attempt
+
+        Returns:
+            object: The result of the operation
+        """
+        if deadline is None:
+            deadline = time.perf_counter() + self.deadline
+        attempt = 0
+
+        while True:
+            attempt += 1
+            try:
+                return operation()
+            except (Exception) as error:
+                delay = self.get_delay(attempt)
+                remaining = deadline - time.perf_counter()
+                if not is_retryable(error):
+                    LoggingManager.logger.debug(
+                        "%s failed on attempt %s with an error that is not "
+                        "retryable", description, attempt,
+                        extra={"attempt": attempt, "outcome": "fatal"})
+                    raise
+                if delay >= remaining:
+                    LoggingManager.logger.debug(
+                        "%s failed on attempt %s and the retry deadline has "
+                        "passed", description, attempt,
+                        extra={"attempt": attempt, "outcome": "deadline"})
+                    raise
+
+                LoggingManager.logger.debug(
+                    "%s failed on attempt %s: %s. Retrying in %.3f seconds.",
+                    description, attempt, str(error).strip(), delay,
+                    extra={"attempt": attempt, "outcome": "retry"})
+                if on_retry is not None:
+                    on_retry(attempt, error)
+                time.sleep(delay)
@@ -0,0 +1,89 @@
+"""Simple class to store the measurements of a test run
+"""
+from dataclasses import asdict, dataclass, field
+
+
+@dataclass
+class RunRecord:
+    """Stores the outcome, stage timings and performance numbers of a
+    test run
+    """
+
+    run_id: str
+    timestamp: float
+    succeeded: bool = False
+    stages: dict = field(default_factory=dict)
+    replication_catch_up: dict = field(default_factory=dict)
+    load: dict = field(default_factory=dict)
+    benchmark: dict = field(default_factory=dict)
+    visibility: dict = field(default_factory=dict)
+    connection_storm: dict = field(default_factory=dict)
+    tls_benchmark: dict = field(default_factory=dict)
+    promotion: dict = field(default_factory=dict)
+    regressions: list = field(default_factory=list)
+
+    def to_dict(self):
+        """ Converts the record to a dictionary that can be stored as JSON
+
+        Returns:
+            dict: The record values
+        """
+        return asdict(self)
+
+    def get_metrics(self):
+        """ Flattens the measurements that are compared across runs
+
+        Returns:
+            dict: (value, higher is better) keyed by metric name
+        """
+        return RunRecord.flatten(self.to_dict())
+
+    @staticmethod
+    def flatten(record):
+        """ Flattens the measurements of a stored record
+
+        Args:
+            record (dict): A record as returned by to_dict
+
+        Returns:
+            dict: (value, higher is better) keyed by metric name
+        """
+        metrics = {}
+        for stage, seconds in record.get("stages", {}).items():
+            metrics["stage." + stage] = (seconds, False)
+
+        catch_up = {pod: seconds for pod, seconds
+                    in record.get("replication_catch_up", {}).items()
+                    if seconds is not None}
+        if catch_up:
+            metrics["replication_catch_up.max"] = (max(catch_up.values()),
+                                                   False)
+
+        for key in ("rows_per_second", "mb_per_second"):
+            if key in record.get("load", {}):
+                metrics["load." + key] = (record["load"][key], True)
+
+        for service, result in record.get("benchmark", {}).items():
+            metrics["benchmark.%s.tps" % (service)] = (result["tps"], True)
+            if result.get("p99_ms") is not None:
+                metrics["benchmark.%s.p99_ms" % (service)] = (
+                    result["p99_ms"], False)
+
+        for target, result in record.get("visibility", {}).items():
+            if result.get("p99_ms") is not None:
+                metrics["visibility.%s.p99_ms" % (target)] = (
+                    result["p99_ms"], False)
+
+        for target, result in record.get("connection_storm", {}).items():
+            if result.get("total", {}).get("p99_ms") is not None:
+                metrics["connection_storm.%s.p99_ms" % (target)] = (
+                    result["total"]["p99_ms"], False)
+
+        for target, modes in record.get("tls_benchmark", {}).items():
+            for sslmode, result in modes.items():
+                if result.get("total", {}).get("p50_ms") is not None:
+                    metrics["tls_benchmark.%s.%s.connect_p50_ms" % (
+                        target, sslmode)] = (result["total"]["p50_ms"],
+                                             False)
+
+        return metrics
@@ -0,0 +1,147 @@
+"""Contains the ScheduleManager class
+"""
+import os
+import random
+import threading
+import time
+from connection_manager import ConnectionManager
+from logging_manager import LoggingManager
+from metrics_manager import MetricsManager
+
+
+class ScheduleManager:
+    """Runs the tests every SCHEDULE_INTERVAL seconds plus a random jitter
+    so a fleet of sidecars does not test at the same moment. Lightweight
+    probe runs fill the ticks between full runs. Runs never overlap: a tick
+    that passes during a run is skipped. A run that exceeds RUN_BUDGET has
+    its queries cancelled.
+    """
+
+    def __init__(self, run_scheduled):
+        """ Initializes the scheduler
+
+        Args:
+            run_scheduled (function): Called with the run kind, full or
+                probe, and the perf_counter deadline of the run. Returns
+                True if the run passed, False if it failed or None if there
+                was nothing to test.
+        """
+        self.cm = ConnectionManager()
+        self.mm = MetricsManager()
+        self.run_scheduled = run_scheduled
+        self.wake = threading.Event()
+        self.runs_since_full = 0
+        self.over_budget = False
+
+    @staticmethod
+    def is_enabled():
+        """ Determines if scheduled test runs are configured
+
+        Returns:
+            bool: True if SCHEDULE_INTERVAL is positive
+        """
+        return float(os.getenv('SCHEDULE_INTERVAL')) > 0
+
+    def trigger(self):
+        """ Requests a full run outside the schedule, for example after
+            the pod became the primary. Safe to call from any thread.
+        """
+        self.wake.set()
+
+    def run(self):
+        """ Runs a full test right away, then waits for each scheduled
+            tick or trigger and runs the tests on the calling thread until
+            the process exits. Ticks are anchored to the start of the
+            schedule so the jitter of one tick does not shift the ones
+            after it. Ticks that pass while a run is in progress are
+            skipped.
+        """
+        interval = float(os.getenv('SCHEDULE_INTERVAL'))
+        jitter = float(os.getenv('SCHEDULE_JITTER'))
+        every = max(1, int(os.getenv('SCHEDULE_FULL_RUN_EVERY')))
+        LoggingManager.logger.info(
+            "Scheduling test runs every %s seconds with up to %s seconds "
+            "of jitter and a full run every %s run(s)", interval, jitter,
+            every, extra={"stage": "schedule"})
+
+        scheduled = time.perf_counter() + interval
+        next_run = scheduled + random.uniform(0, jitter)
+        self.trigger()
+
+        while True:
+            triggered = self.wake.wait(
+                max(0, next_run - time.perf_counter()))
+
+            kind = 'full' if triggered or self.runs_since_full >= every - 1 \
+                else 'probe'
+            self.runs_since_full = 0 if kind == 'full' \
+                else self.runs_since_full + 1
+            self.execute(kind)
+
+            # the run just finished serves requests made while it ran
+            self.wake.clear()
+
+            if not triggered:
+                scheduled += interval
+                next_run = scheduled + random.uniform(0, jitter)
+
+            # skip the ticks that passed while the run was in progress
+            while next_run <= time.perf_counter():
+                LoggingManager.logger.warning(
+                    "Skipping a scheduled run. The previous run was still "
+                    "in progress.",
+                    extra={"stage": "schedule", "outcome": "skipped"})
+                self.mm.record_scheduled_run('skipped')
+                scheduled += interval
+                next_run = scheduled + random.uniform(0, jitter)
+
+    def execute(self, kind):
+        """ Runs the tests within RUN_BUDGET seconds and records the outcome
+
+        Args:
+            kind (str): full or probe
+        """
+        budget = float(os.getenv('RUN_BUDGET'))
+        started = time.perf_counter()
+        self.over_budget = False
+        timer = threading.Timer(budget, self.stop_run, args=(kind, budget))
+        timer.daemon = True
+        timer.start()
+
+        succeeded = False
+        try:
+            succeeded = self.run_scheduled(kind, started + budget)
+        except (Exception) as error:
+            LoggingManager.logger.error(error, exc_info=True)
+        finally:
+            timer.cancel()
+
+        # a pod that is not the primary has nothing to test
+        if succeeded is None:
+            return
+
+        seconds = time.perf_counter() - started
+        if self.over_budget:
+            outcome = 'over_budget'
+        else:
+            outcome = 'passed' if succeeded else 'failed'
+        LoggingManager.logger.info(
+            "Scheduled %s run %s in %.3f seconds", kind, outcome, seconds,
+            extra={"stage": "schedule", "outcome": outcome,
+                   "duration_ms": round(seconds * 1000, 3)})
+        self.mm.record_scheduled_run(outcome, kind, seconds)
+
+    def stop_run(self, kind, budget):
+        """ Cancels the queries of a run that exceeded its budget. The run
+            fails at its next query or stage and still cleans up.
+
+        Args:
+            kind (str): full or probe
+            budget (float): The run budget in seconds
+        """
+        self.over_budget = True
+        cancelled = self.cm.cancel_active_queries()
+        LoggingManager.logger.warning(
+            "The %s run exceeded its %s second budget. Cancelled queries "
+            "on %s connection(s).", kind, budget, cancelled,
+            extra={"stage": "schedule", "outcome": "over_budget"})
@@ -1,54 +1,191 @@
 """ Synchronizes the target ArgoCD application
 """
 from logging_manager import LoggingManager
-import urllib3
-import requests
+from performance_gate import PerformanceGate
+from trace_manager import TraceManager
 import os
+import time
 
 
 class SyncManager:
     """ Synchronizes the target ArgoCD application
     """
 
-    # init the logging manager
-    lm = LoggingManager()
+    # initialize the managers
+    def __init__(self):
+        self.gate = PerformanceGate()
 
-    def synch_argocd_application(self):
-        """ Uses ArgoCD API to synch teh target application
+    def promote(self, run_record):
+        """ Synchs the target application if the run is within the
+            configured performance thresholds
+
+        Args:
+            run_record (RunRecord): The measurements of the test run
+
+        Returns:
+            bool: True if the application was synched and is healthy
         """
-        # gets the argocd token
-        token = os.getenv("ARGOCD_TOKEN")
+        SyncManager.promotion = {}
+        reasons = self.gate.evaluate(run_record)
+        if reasons:
+            for reason in reasons:
+                LoggingManager.logger.warning(
+                    "Promotion blocked: %s", reason,
+                    extra={"stage": "performance_gate", "reason": reason,
+                           "outcome": "blocked"})
+            LoggingManager.logger.warning(
+                "******* PROMOTION BLOCKED BY PERFORMANCE GATE *******",
+                extra={"stage": "performance_gate", "outcome": "blocked"})
+            return False
 
-        # assigns the token to the set
-        # strips trailing "\n" that is added when the
-        # token is added to the set
-        cookies = {'argocd.token': token.strip("\n")}
-        LoggingManager.logger.debug(cookies)
+        LoggingManager.logger.info(
+            "Performance gate passed.",
+            extra={"stage": "performance_gate", "outcome": "success"})
+        return self.synch_argocd_application()
 
-        ip = os.getenv("ARGOCD_SERVICE_ADDRESS")
-        app_name = os.getenv("ARGOCD_APP_NAME").lower()
+    # provides the outcome of the last promotion
+    promotion = {}
+
+    # the http session is created on first use and reused between syncs
+    session = None
 
-        # creates the url that will be used in the synch api call
-        synch_url = 'https://%s/api/v1/applications/%s/sync' % (ip, app_name)
-        LoggingManager.logger.debug("synch_url: %s" % (synch_url))
+    def get_session(self):
+        """ Gets the pooled HTTP session for the ArgoCD API
+
+        Returns:
+            requests.Session: The session with the ArgoCD token cookie
+        """
+        if SyncManager.session is not None:
+            return SyncManager.session
+
+        # imported on first use to keep the sidecar startup fast
+        import requests
+        import urllib3
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(pool_connections=1,
+                                              pool_maxsize=2))
+
+        # strips trailing "\n" that is added when the
+        # token is added to the set
+        token = os.getenv("ARGOCD_TOKEN")
+        session.cookies.set('argocd.token', token.strip("\n"))
 
         # suppresses the warning that gets generated when using
         # self-signed certs in the argocd deployment
-        verify_tls = os.getenv("ARGOCD_VERIFY_TLS").lower()
-        if verify_tls == "true":
-            verify = True
+        if os.getenv("ARGOCD_VERIFY_TLS").lower() == "true":
+            session.verify = True
         else:
-            verify = False
+            session.verify = False
             urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-        # post the synch request to the argocd api
+        SyncManager.session = session
+        return session
+
+    @TraceManager.traced
+    def synch_argocd_application(self):
+        """ Uses ArgoCD API to synch teh target application and waits for
+            it to be synced and healthy
+
+        Returns:
+            bool: True if the application is synced and healthy in time
+        """
+        ip = os.getenv("ARGOCD_SERVICE_ADDRESS")
+        app_name = os.getenv("ARGOCD_APP_NAME").lower()
+        timeout = float(os.getenv("ARGOCD_REQUEST_TIMEOUT"))
+        deadline = float(os.getenv("ARGOCD_SYNC_TIMEOUT"))
+        app_url = 'https://%s/api/v1/applications/%s' % (ip, app_name)
+        started = time.perf_counter()
+        status = {}
+
         try:
-            resp = requests.post(synch_url, cookies=cookies, verify=verify)
-            LoggingManager.logger.info("Successfully synched the %s ArgoCD "
+            session = self.get_session()
+
+            # post the synch request to the argocd api
+            synch_url = app_url + '/sync'
+            LoggingManager.logger.debug("synch_url: %s" % (synch_url))
+            resp = session.post(synch_url, timeout=timeout)
+            LoggingManager.logger.debug(resp)
+            LoggingManager.logger.debug(resp.content)
+            resp.raise_for_status()
+            LoggingManager.logger.info("Started the synch of the %s ArgoCD "
                                        "application." % (app_name))
+
+            status = self.wait_for_application(session, app_url, timeout,
+                                               started + deadline)
         except (Exception) as error:
-            LoggingManager.logger.error(error, exc_info=True)
+            LoggingManager.logger.error(error, exc_info=True,
+                                        extra={"stage": "argocd_sync",
+                                               "outcome": "failure"})
+
+        seconds = time.perf_counter() - started
+        succeeded = status.get("pending") is False and \
+            status.get("sync") == "Synced" and \
+            status.get("health") == "Healthy" and \
+            status.get("phase") in (None, "Succeeded")
+        SyncManager.promotion = {"succeeded": succeeded, "seconds": seconds,
+                                 **status}
+
+        if succeeded:
+            LoggingManager.logger.info(
+                "Successfully synched the %s ArgoCD application. Promotion "
+                "took %.3f seconds." % (app_name, seconds),
+                extra={"stage": "argocd_sync", "outcome": "success",
+                       "duration_ms": round(seconds * 1000, 3)})
+        else:
+            LoggingManager.logger.error(
+                "The %s ArgoCD application was not synched and healthy "
+                "after %.3f seconds: %s" % (app_name, seconds, status),
+                extra={"stage": "argocd_sync", "outcome": "failure",
+                       "duration_ms": round(seconds * 1000, 3)})
+        return succeeded
+
+    def wait_for_application(self, session, app_url, timeout, deadline):
+        """ Polls the application with backoff until the synch operation
+            has finished and the application is synced and healthy, the
+            operation fails or the deadline passes
+
+        Args:
+            session (requests.Session): The ArgoCD API session
+            app_url (str): The application API url
+            timeout (float): Seconds each request may take
+            deadline (float): perf_counter value to stop polling at
+
+        Returns:
+            dict: The last seen sync status, health status and operation
+            phase and whether the operation is still pending
+        """
+        delay = float(os.getenv("ARGOCD_POLL_INTERVAL"))
+        max_delay = float(os.getenv("ARGOCD_POLL_MAX_INTERVAL"))
+        status = {}
+
+        while True:
+            resp = session.get(app_url, timeout=timeout)
+            resp.raise_for_status()
+            app = resp.json()
+            app_status = app.get("status", {})
+            # the operation is cleared once the controller has finished it
+            status = {
+                "sync": app_status.get("sync", {}).get("status"),
+                "health": app_status.get("health", {}).get("status"),
+                "phase": app_status.get("operationState", {}).get("phase"),
+                "pending": "operation" in app
+            }
+            LoggingManager.logger.debug(
+                "ArgoCD application status: %s", status,
+                extra={"stage": "argocd_sync", **status})
+
+            if status["phase"] in ("Failed", "Error"):
+                return status
+            if not status["pending"] and \
+                    status["phase"] in (None, "Succeeded") and \
+                    status["sync"] == "Synced" and \
+                    status["health"] == "Healthy":
+                return status
 
-        # log response values
-        LoggingManager.logger.debug(resp)
-        LoggingManager.logger.debug(resp.content)
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return status
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, max_delay)
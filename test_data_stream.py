@@ -0,0 +1,48 @@
+"""Contains the TestDataStream class
+"""
+import random
+
+
+class TestDataStream:
+    """A file-like object that generates tab separated test rows on demand
+    so COPY FROM STDIN can load any number of rows in bounded memory
+    """
+
+    def __init__(self, row_count, row_width):
+        """ Initializes the stream
+
+        Args:
+            row_count (int): The number of rows to generate
+            row_width (int): The number of payload characters per row
+        """
+        self.row_count = row_count
+        self.row_width = row_width
+        self.bytes_read = 0
+        self._next_row = 1
+        self._buffer = b''
+
+    def read(self, size=8192):
+        """ Reads up to size bytes of generated rows
+
+        Args:
+            size (int, optional): The maximum bytes to return.
+            Defaults to 8192.
+
+        Returns:
+            bytes: The next chunk of rows or b'' when all rows are read
+        """
+        # generate whole rows until the buffer can fill the request
+        rows = []
+        buffered = len(self._buffer)
+        payload_bytes = (self.row_width + 1) // 2
+        while buffered < size and self._next_row <= self.row_count:
+            payload = random.randbytes(payload_bytes).hex()[:self.row_width]
+            row = '%d\t%s\n' % (self._next_row, payload)
+            rows.append(row)
+            buffered += len(row)
+            self._next_row += 1
+
+        data = self._buffer + ''.join(rows).encode()
+        chunk, self._buffer = data[:size], data[size:]
+        self.bytes_read += len(chunk)
+        return chunk
@@ -3,28 +3,75 @@
 Raises:
     ValueError: If query row count doesn't match expected value raise an error.
 """
+import atexit
+import json
 import os
+import signal
+import sys
+import threading
 import time
+from benchmark_manager import BenchmarkManager
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from config_manager import ConfigManager
 from connection_manager import ConnectionManager
+from connection_storm_manager import ConnectionStormManager
+from controller_manager import ControllerManager, EXIT_NOT_PRIMARY
 from databases import Databases
 from database_manager import DatabaseManager
 from db_connection_type import DBConnectionType
+from failover_rto_manager import FailoverRtoManager
+from failover_watcher import FailoverWatcher
+from health_probe_manager import HealthProbeManager
+from history_manager import HistoryManager
 from logging_manager import LoggingManager
+from metrics_manager import MetricsManager
+from pod_cache import PodCache
+from psycopg2 import sql
 from replica_manager import ReplicaManager
+from replica_validation_result import ReplicaValidationResult
+from run_record import RunRecord
+from schedule_manager import ScheduleManager
 from sync_manager import SyncManager
+from tls_benchmark_manager import TlsBenchmarkManager
+from trace_manager import TraceManager
 from user_manager import UserManager
-
-
-# initialize classes
-lm = LoggingManager()
-cm = ConnectionManager()
-dbm = DatabaseManager()
-rm = ReplicaManager()
-um = UserManager()
-sm = SyncManager()
+from visibility_probe_manager import VisibilityProbeManager
+
+
+# the managers are created by create_managers
+lm = None
+cm = None
+dbm = None
+rm = None
+um = None
+sm = None
+bm = None
+mm = None
+tm = None
+hm = None
+vm = None
+pc = None
+hpm = None
+csm = None
+tbm = None
 
 global has_run_as_primary
 global is_primary
+has_run_as_primary = False
+is_primary = None
+
+# measurements of the current test run
+run_record = None
+
+# the time to first test is reported once per process
+has_reported_startup = False
+
+# runs tests on a schedule when SCHEDULE_INTERVAL is set
+scheduler = None
+
+# perf_counter value a scheduled run must finish by
+run_deadline = None
 
 
 def run_tests():
@@ -36,21 +83,29 @@ def run_tests():
     """
 
     # Log entry for new test run
-    LoggingManager.logger.info('******* STARTING NEW TEST RUN *******')
+    run_id = lm.start_run()
+    LoggingManager.logger.info('******* STARTING NEW TEST RUN *******',
+                               extra={"stage": "run_tests",
+                                      "outcome": "started"})
+    tm.start_trace('run_tests', run_id)
+    global run_record
+    run_record = RunRecord(run_id, time.time())
+    succeeded = False
+    dbm.use_run_schema(run_id)
 
     try:
         # set locals
         conn = None
         primary_test_db_conn = None
         replica_test_db_conn = None
-        replica_pod_db_conn = None
         cur = None
         primary_test_cur = None
         replica_test_cur = None
-        replica_pod_cur = None
+        lsn = None
 
-        # allow time for pod to full initialize
-        time.sleep(5)
+        # wait for the pod to initialize
+        wait_for_pod_ready()
+        report_time_to_first_test()
         global is_primary
         is_primary = is_host_primary_data_pod()
         if not is_primary:
@@ -64,7 +119,8 @@ def run_tests():
             return
 
         # get postgres database connection
-        cm.connect_to_postgres_db()
+        with stage('connect_postgres_db'):
+            cm.connect_to_postgres_db()
         conn = cm.postgres_db_connection
 
         # get cursor
@@ -74,14 +130,23 @@ def run_tests():
             # print the current postgres version
             get_version(cur)
 
+            # drop test objects left by an interrupted run
+            with stage('reconcile'):
+                dbm.reconcile_postgres_db_objects(cur)
+
             # # create the test user
             um.create_test_user(cur)
 
+            # the storm user replicates with the test data
+            if os.getenv('CONNECTION_STORM_ENABLED').lower() == 'true':
+                um.create_storm_user(cur)
+
             # switch from the postgres user to the test user
             um.switch_to_test_user(cur)
 
             # create the test database
-            dbm.create_database(cur)
+            with stage('create_database'):
+                dbm.create_database(cur)
         else:
             err = 'Unable to connect to the postgres database'
             raise ConnectionError(err, conn)
@@ -89,78 +154,257 @@ def run_tests():
         # connect to the primary test database with the test user
         cm.connect_to_primary_test_db()
         primary_test_db_conn = cm.primary_test_db_connection
-
-        if primary_test_db_conn is not None:
-
-            # get test_db cursor
-            primary_test_cur = primary_test_db_conn.cursor()
-
+        if primary_test_db_conn is None:
+            err = 'Unable to connect to the primary test database'
+            raise ConnectionError(err, primary_test_db_conn)
+
+        # get test_db cursor
+        primary_test_cur = primary_test_db_conn.cursor()
+
+        # drop test schemas left by interrupted runs
+        with stage('reconcile_schemas'):
+            dbm.reconcile_test_db_objects(primary_test_cur)
+
+        # a clone of the template already has the test data
+        if dbm.cloned_from_template:
+            LoggingManager.logger.info(
+                "Test data was cloned from %s", dbm.template_name,
+                extra={"stage": "create_table"})
+        else:
             # create a test schema in the test database
-            dbm.create_schema(primary_test_cur)
+            with stage('create_schema'):
+                dbm.create_schema(primary_test_cur)
 
             # create a table with data in the test schema
-            dbm.create_table(primary_test_cur)
+            with stage('create_table'):
+                run_record.load = dbm.create_table(primary_test_cur)
+
+        # record the wal position replicas must reach
+        lsn = dbm.get_current_wal_lsn(primary_test_cur)
 
-            validate_data(primary_test_cur, DBConnectionType.PRIMARY_SERVICE)
+        with stage('validate_primary_service'):
+            validate_data(primary_test_cur,
+                          DBConnectionType.PRIMARY_SERVICE)
 
-        # allow time for replication to complete
-        time.sleep(10)
+        # only a validated load may become the test data template
+        dbm.mark_template_loaded()
 
         # connect to the replica test database
         # via the replica service with the test user
         rm.get_replica_pods()
         if rm.has_replicas is True:
 
+            # wait for the replicas to replay the test data
+            if lsn is not None:
+                with stage('replication_catch_up'):
+                    catch_up_times = rm.wait_for_replica_pods(lsn)
+                mm.record_catch_up_times(catch_up_times)
+                run_record.replication_catch_up = catch_up_times
+
             cm.connect_to_replica_test_db_via_replica_service()
             replica_test_db_conn = cm.replica_test_db_connection
+            if replica_test_db_conn is None:
+                err = 'Unable to connect to the replica test database'
+                raise ConnectionError(err, replica_test_db_conn)
 
-            if replica_test_db_conn is not None:
-
-                # get test_db cursor
-                replica_test_cur = replica_test_db_conn.cursor()
+            # get test_db cursor
+            replica_test_cur = replica_test_db_conn.cursor()
+            with stage('validate_replica_service'):
                 validate_data(replica_test_cur,
                               DBConnectionType.REPLICA_SERVICE)
 
-            # validate data at each replica pod
-            for pod in rm.replica_pod_list:
-                cm.connect_to_replica_test_db_via_replica_pod(pod)
-                replica_pod_db_conn = cm.replica_pod_db_connection
-                replica_pod_cur = replica_pod_db_conn.cursor()
-                validate_data(replica_pod_cur,
-                              DBConnectionType.REPLICA_POD, pod)
-                cleanup(replica_pod_cur, Databases.TEST_DB,
-                        DBConnectionType.REPLICA_POD)
+            # validate data at each replica pod concurrently
+            with stage('validate_replica_pods'):
+                validate_replica_pods(rm.replica_pod_list)
+
+            # measure how soon primary writes are visible on the replicas
+            if os.getenv('VISIBILITY_PROBE_ENABLED').lower() == 'true' \
+                    and primary_test_cur is not None:
+                with stage('visibility_probe'):
+                    run_record.visibility = vm.run_probe(
+                        primary_test_cur, rm.replica_pod_list)
+                mm.record_visibility(run_record.visibility)
         else:
             LoggingManager.logger.warning("No replica pods detected. "
                                           "This postgres cluster is not "
                                           "highly available.")
 
+        # measure connection setup under a burst of concurrent connects
+        if os.getenv('CONNECTION_STORM_ENABLED').lower() == 'true':
+            with stage('connection_storm'):
+                run_record.connection_storm = csm.run_storms(
+                    rm.replica_pod_list)
+            mm.record_connection_storm(run_record.connection_storm)
+
+        # compare the connection and query cost of sslmodes
+        if os.getenv('TLS_BENCHMARK_ENABLED').lower() == 'true':
+            with stage('tls_benchmark'):
+                run_record.tls_benchmark = tbm.run_benchmarks(
+                    rm.replica_pod_list)
+            mm.record_tls_benchmark(run_record.tls_benchmark)
+
+        # benchmark the primary and replica services
+        if os.getenv('BENCHMARK_ENABLED').lower() == 'true' \
+                and primary_test_cur is not None:
+            with stage('benchmark'):
+                run_record.benchmark = bm.run_benchmarks(primary_test_cur,
+                                                         rm.has_replicas)
+
         # assigning last run state
         has_run_as_primary = True
 
+        # compare the run with the run history
+        check_regressions()
+
         # sync argocd app if auto-promote is enabled
+        # and the run is within the performance thresholds
         if os.getenv("AUTO_PROMOTE").lower() == "true":
-            sm.synch_argocd_application()
+            with stage('argocd_sync'):
+                sm.promote(run_record)
+            if sm.promotion:
+                run_record.promotion = sm.promotion
+                mm.record_promotion(sm.promotion)
 
-        LoggingManager.logger.info('******* SUCCESS: ALL TESTS PASSED *******')
+        LoggingManager.logger.info('******* SUCCESS: ALL TESTS PASSED *******',
+                                   extra={"stage": "run_tests",
+                                          "outcome": "success"})
+        succeeded = True
 
     except (Exception) as error:
-        LoggingManager.logger.error(error, exc_info=True)
+        LoggingManager.logger.error(error, exc_info=True,
+                                    extra={"stage": "run_tests",
+                                           "outcome": "failure"})
     finally:
         if is_primary is True:
-            if rm.has_replicas is True:
-                cleanup(replica_test_cur, Databases.TEST_DB,
-                        DBConnectionType.REPLICA_SERVICE)
-                cleanup(replica_pod_cur,
-                        Databases.TEST_DB, DBConnectionType.REPLICA_POD)
-            cleanup(primary_test_cur, Databases.TEST_DB,
-                    DBConnectionType.PRIMARY_SERVICE)
-            cleanup(cur, Databases.POSTGRES,
-                    DBConnectionType.PRIMARY_SERVICE)
+            with stage('cleanup'):
+                if rm.has_replicas is True:
+                    cleanup(replica_test_cur, Databases.TEST_DB,
+                            DBConnectionType.REPLICA_SERVICE)
+                cleanup(primary_test_cur, Databases.TEST_DB,
+                        DBConnectionType.PRIMARY_SERVICE)
+                cleanup(cur, Databases.POSTGRES,
+                        DBConnectionType.PRIMARY_SERVICE)
+            run_record.succeeded = succeeded
+            mm.record_run(succeeded)
+            save_run_history()
+
+        # summarize where the run spent its time. Runs that are not primary
+        # end their trace too so it does not leak into the next run.
+        tm.end_trace()
+        tm.log_waterfall()
+        tm.export()
+
+
+def run_probe(deadline=None):
+    """ Runs a lightweight probe of the primary service, the replica
+    service and each replica pod that creates no test objects
+
+    Args:
+        deadline (float, optional): perf_counter value to stop retrying
+        connections at. Defaults to the retry policy deadline.
+
+    Returns:
+        bool: True if every target answered with its expected role
+    """
+    run_id = lm.start_run()
+    LoggingManager.logger.info('******* STARTING NEW PROBE RUN *******',
+                               extra={"stage": "probe",
+                                      "outcome": "started"})
+    tm.start_trace('run_probe', run_id)
+    try:
+        rm.get_replica_pods()
+        results = hpm.run_probe(rm.replica_pod_list, deadline)
+        mm.record_probe(results)
+        return all(result["succeeded"] for result in results.values())
+    finally:
+        tm.end_trace()
+        tm.export()
+
+
+def run_scheduled(kind, deadline):
+    """ Runs a scheduled full or probe run if the pod is the primary
+
+    Args:
+        kind (str): full or probe
+        deadline (float): perf_counter value the run must finish by
+
+    Returns:
+        bool: True if the run passed, False if it failed or None if the
+            pod is not the primary
+    """
+    global is_primary
+    global has_run_as_primary
+    is_primary = is_host_primary_data_pod()
+    if not is_primary:
+        LoggingManager.logger.debug("Not primary. Skipping the %s run.",
+                                    kind)
+        has_run_as_primary = False
+        return None
+
+    global run_deadline
+    run_deadline = deadline
+    try:
+        if kind == 'probe':
+            return run_probe(deadline)
+        run_tests()
+        return run_record.succeeded
+    finally:
+        run_deadline = None
+        # failed runs are retried by the schedule, not the failover check
+        has_run_as_primary = True
+
 
-        # remove logging handlers from logger
-        lm.remove_handlers(LoggingManager.logger)
-        cm.close_kubernetes_connection()
+@contextmanager
+def stage(name):
+    """ Times a test stage as a metric and as a trace span
+
+    Args:
+        name (str): The name of the stage
+    """
+    started = time.perf_counter()
+    outcome = "failure"
+    try:
+        # a run out of budget only cleans up
+        if run_deadline is not None and name != 'cleanup' \
+                and started > run_deadline:
+            raise TimeoutError(
+                'The run budget was used up before the %s stage' % name)
+        with tm.span(name), mm.time_stage(name):
+            yield
+        outcome = "success"
+    finally:
+        duration = time.perf_counter() - started
+        if run_record is not None:
+            run_record.stages[name] = duration
+        duration_ms = round(duration * 1000, 3)
+        LoggingManager.logger.debug(
+            'Stage %s %s in %s ms', name, outcome, duration_ms,
+            extra={"stage": name, "duration_ms": duration_ms,
+                   "outcome": outcome})
+
+
+def check_regressions():
+    """ Checks the current run for regressions against the run history
+    """
+    if os.getenv('RUN_HISTORY_ENABLED').lower() != 'true':
+        return
+
+    try:
+        run_record.regressions = hm.find_regressions(run_record)
+    except (Exception) as error:
+        LoggingManager.logger.error(error, exc_info=True)
+
+
+def save_run_history():
+    """ Appends the current run to the run history
+    """
+    if os.getenv('RUN_HISTORY_ENABLED').lower() != 'true':
+        return
+
+    try:
+        hm.save_run(run_record)
+    except (Exception) as error:
+        LoggingManager.logger.error(error, exc_info=True)
 
 
 def validate_data(db_cur, DBConnectionType, pod=None):
@@ -177,21 +421,30 @@ def validate_data(db_cur, DBConnectionType, pod=None):
     if db_cur is not None:
 
         # validate data
+        expected = dbm.row_count
+        fields = {"stage": "validate_data",
+                  "connection_type": DBConnectionType.name,
+                  "replica_pod": pod.metadata.name if pod else None,
+                  "expected_rows": expected}
         if pod is not None:
-            msg = 'Validating {type} Data for pod {pod_name}: Expecting 1000 '\
-                'Rows'.format(type=DBConnectionType,
-                              pod_name=pod.metadata.name)
+            msg = 'Validating {type} Data for pod {pod_name}: Expecting '\
+                '{rows} Rows'.format(type=DBConnectionType,
+                                     pod_name=pod.metadata.name,
+                                     rows=expected)
         else:
-            msg = 'Validating {type} Data: Expecting 1000 '\
-                'Rows'.format(type=DBConnectionType)
+            msg = 'Validating {type} Data: Expecting {rows} '\
+                'Rows'.format(type=DBConnectionType, rows=expected)
 
-        LoggingManager.logger.info(msg)
-        db_cur.execute('SELECT COUNT(0) from test_schema.test_table')
+        LoggingManager.logger.info(msg, extra=fields)
+        for table_name in dbm.table_names:
+            db_cur.execute(sql.SQL('SELECT COUNT(0) from {}').format(
+                sql.Identifier(dbm.schema_name, table_name)))
 
-        # get the row count from the query result
-        row_count = db_cur.fetchone()[0]
+            # get the row count from the query result
+            row_count = db_cur.fetchone()[0]
 
-        assert row_count == 1000, "row count should be 1000"
+            assert row_count == expected, \
+                "%s row count should be %s" % (table_name, expected)
 
         if pod is not None:
             msg = '*** {type} Validation Succeeded for pod {pod_name}! '\
@@ -200,13 +453,224 @@ def validate_data(db_cur, DBConnectionType, pod=None):
             msg = '*** {type} Validation Succeeded! ***'.format(
                 type=DBConnectionType)
 
-        LoggingManager.logger.info(msg)
+        LoggingManager.logger.info(msg, extra=dict(fields,
+                                                   outcome="success"))
 
     else:
         err = 'Unable to validate data.  The cursor is not assigned.'
         raise ConnectionError(err, db_cur)
 
 
+def validate_replica_pods(pods):
+    """ Validates the data on each replica pod concurrently. Each pod
+    gets its own connection so the total wall-clock time is roughly
+    that of the slowest replica.
+
+    Args:
+        pods (list): The kubernetes.client.models.v1_pod replica pods
+
+    Raises:
+        ValueError: If validation failed for one or more replica pods
+
+    Returns:
+        list: ReplicaValidationResult for each replica pod
+    """
+    workers = max(1, int(os.getenv('REPLICA_VALIDATION_WORKERS')))
+    if os.getenv('VALIDATION_MODE').lower() == 'checksum':
+        # one more worker checksums the primary
+        workers += 1
+    LoggingManager.logger.debug('Validating replica pods with %s '
+                                'worker(s)', workers)
+
+    # validate each replica pod in the worker pool
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        if os.getenv('VALIDATION_MODE').lower() == 'checksum':
+            results = validate_replica_pod_checksums(executor, pods)
+        else:
+            results = list(executor.map(
+                tm.propagate(validate_replica_pod), pods))
+    elapsed = time.perf_counter() - started
+
+    # log per pod timings
+    for result in results:
+        outcome = 'success' if result.succeeded else 'failure'
+        LoggingManager.logger.info(
+            'Replica pod %s validation %s in %.3f seconds',
+            result.pod_name, 'succeeded' if result.succeeded else 'failed',
+            result.duration,
+            extra={"stage": "validate_replica_pod",
+                   "replica_pod": result.pod_name,
+                   "duration_ms": round(result.duration * 1000, 3),
+                   "outcome": outcome})
+    LoggingManager.logger.info(
+        'Validated %s replica pod(s) in %.3f seconds', len(results), elapsed,
+        extra={"stage": "validate_replica_pods",
+               "replica_pods": len(results),
+               "duration_ms": round(elapsed * 1000, 3)})
+
+    mm.record_replica_validations(results)
+
+    failed = [result.pod_name for result in results
+              if not result.succeeded]
+    if failed:
+        err = 'Replica pod validation failed for: ' + ', '.join(failed)
+        raise ValueError(err)
+
+    return results
+
+
+@TraceManager.traced
+def validate_replica_pod(pod):
+    """ Validates the data on a single replica pod using a dedicated
+    connection
+
+    Args:
+        pod (kubernetes.client.models.v1_pod): The target replica pod
+
+    Returns:
+        ReplicaValidationResult: The validation outcome and duration
+    """
+    conn = None
+    cur = None
+    started = time.perf_counter()
+    try:
+        conn = cm.open_replica_pod_test_db_connection(pod)
+        if conn is not None:
+            cur = conn.cursor()
+        validate_data(cur, DBConnectionType.REPLICA_POD, pod)
+        succeeded = True
+        error = None
+    except (Exception) as err:
+        LoggingManager.logger.error(err, exc_info=True,
+                                    extra={"stage": "validate_replica_pod",
+                                           "replica_pod": pod.metadata.name,
+                                           "outcome": "failure"})
+        succeeded = False
+        error = err
+    finally:
+        if cur is not None:
+            cur.close()
+        cm.close_connection(conn, Databases.TEST_DB,
+                            DBConnectionType.REPLICA_POD)
+
+    return ReplicaValidationResult(pod.metadata.name, succeeded,
+                                   time.perf_counter() - started, error)
+
+
+def validate_replica_pod_checksums(executor, pods):
+    """ Compares key range checksums of the test tables on each replica
+    pod with those on the primary. The primary and the replicas are
+    checksummed concurrently in the executor.
+
+    Args:
+        executor (ThreadPoolExecutor): The validation worker pool
+        pods (list): The kubernetes.client.models.v1_pod replica pods
+
+    Raises:
+        ConnectionError: If the primary could not be checksummed
+
+    Returns:
+        list: ReplicaValidationResult for each replica pod
+    """
+    chunk_size = int(os.getenv('CHECKSUM_CHUNK_SIZE'))
+    LoggingManager.logger.info('Validating replica pod checksums in key '
+                               'ranges of %s rows' % (chunk_size))
+
+    # checksum the primary while the replicas are checksummed
+    primary = executor.submit(tm.propagate(get_checksums), None,
+                              chunk_size)
+    replicas = [executor.submit(tm.propagate(get_checksums), pod,
+                                chunk_size) for pod in pods]
+
+    primary_checksums, _, error = primary.result()
+    if error is not None:
+        err = 'Unable to checksum the primary test tables.'
+        raise ConnectionError(err, error)
+
+    results = []
+    for pod, replica in zip(pods, replicas):
+        checksums, duration, error = replica.result()
+        if error is None:
+            mismatches = compare_checksums(primary_checksums, checksums,
+                                           chunk_size)
+            for table_name, first_key, last_key in mismatches:
+                LoggingManager.logger.error(
+                    'Checksum mismatch on pod %s in %s for keys %s to %s',
+                    pod.metadata.name, table_name, first_key, last_key,
+                    extra={"stage": "validate_checksums",
+                           "replica_pod": pod.metadata.name,
+                           "table": table_name, "first_key": first_key,
+                           "last_key": last_key, "outcome": "failure"})
+            if not mismatches:
+                LoggingManager.logger.info(
+                    '*** {type} Checksum Validation Succeeded for pod '
+                    '{pod_name}! ***'.format(
+                        type=DBConnectionType.REPLICA_POD,
+                        pod_name=pod.metadata.name))
+        results.append(ReplicaValidationResult(
+            pod.metadata.name, error is None and not mismatches,
+            duration, error))
+
+    return results
+
+
+@TraceManager.traced
+def get_checksums(pod, chunk_size):
+    """ Checksums the test tables on the primary or a replica pod using a
+    dedicated connection
+
+    Args:
+        pod (kubernetes.client.models.v1_pod): The target replica pod or
+            None for the primary
+        chunk_size (int): The number of keys in each key range
+
+    Returns:
+        tuple: The checksums keyed by table name, the duration in seconds
+            and the error if checksumming failed
+    """
+    conn = None
+    checksums = {}
+    error = None
+    started = time.perf_counter()
+    connection_type = DBConnectionType.PRIMARY_SERVICE if pod is None \
+        else DBConnectionType.REPLICA_POD
+    try:
+        conn = cm.get_connection(Databases.TEST_DB, connection_type, pod)
+        with conn.cursor() as cur:
+            for table_name in dbm.table_names:
+                checksums[table_name] = dbm.get_table_checksums(
+                    cur, table_name, chunk_size)
+    except (Exception) as err:
+        LoggingManager.logger.error(err, exc_info=True)
+        error = err
+    finally:
+        cm.close_connection(conn, Databases.TEST_DB, connection_type)
+
+    return checksums, time.perf_counter() - started, error
+
+
+def compare_checksums(primary_checksums, replica_checksums, chunk_size):
+    """ Finds the key ranges whose checksums differ
+
+    Args:
+        primary_checksums (dict): The primary checksums by table name
+        replica_checksums (dict): The replica checksums by table name
+        chunk_size (int): The number of keys in each key range
+
+    Returns:
+        list: (table name, first key, last key) for each differing range
+    """
+    mismatches = []
+    for table_name, primary in primary_checksums.items():
+        replica = replica_checksums.get(table_name, {})
+        for chunk in sorted(set(primary) | set(replica)):
+            if primary.get(chunk) != replica.get(chunk):
+                mismatches.append((table_name, chunk * chunk_size + 1,
+                                   (chunk + 1) * chunk_size))
+    return mismatches
+
+
 def cleanup(cur, Databases, DBConnectionType):
     """ Cleans all database users and objects created during the tests
 
@@ -223,6 +687,8 @@ def cleanup(cur, Databases, DBConnectionType):
     # cleanup postgres db objects
     if Databases == Databases.POSTGRES:
         um.switch_to_postgres_user(cur)
+        # close pooled test_db connections so it can be dropped
+        cm.close_pooled_connections('test_db')
         # drop test_db and test_user
         dbm.cleanup_postgres_db_objects(cur)
 
@@ -250,6 +716,17 @@ def cleanup(cur, Databases, DBConnectionType):
                                     Databases.TEST_DB, DBConnectionType)
 
 
+def write_run_result():
+    """ Writes the current run record to RUN_RESULT_PATH if it is set
+    """
+    result_path = os.getenv('RUN_RESULT_PATH')
+    if not result_path or run_record is None:
+        return
+
+    with open(result_path, 'w') as result_file:
+        json.dump(run_record.to_dict(), result_file)
+
+
 def get_version(cur):
     """ Connects to the postgres database and gets the current postgres version
 
@@ -265,6 +742,83 @@ def get_version(cur):
     LoggingManager.logger.info(db_version)
 
 
+def wait_for_pod_ready():
+    """ Waits until the pod cache shows this pod with a role label and a
+    Ready condition, or until the readiness timeout passes
+    """
+    host = os.getenv('HOSTNAME')
+    timeout = float(os.getenv('READINESS_TIMEOUT'))
+    started = time.perf_counter()
+
+    while True:
+        pod = pc.get_pod(host)
+        if pod is not None and is_pod_ready(pod):
+            LoggingManager.logger.debug(
+                "Pod %s ready after %.3f seconds", host,
+                time.perf_counter() - started,
+                extra={"stage": "readiness", "outcome": "success"})
+            return
+        if time.perf_counter() - started > timeout:
+            LoggingManager.logger.warning(
+                "Pod %s not ready after %s seconds. Testing anyway.",
+                host, timeout,
+                extra={"stage": "readiness", "outcome": "timeout"})
+            return
+        time.sleep(0.1)
+
+
+def is_pod_ready(pod):
+    """ Determine if the pod has a role and passes its readiness checks
+
+    Args:
+        pod (kubernetes.client.models.v1_pod): The pod to check
+
+    Returns:
+        bool: True if ready
+    """
+    if (pod.metadata.labels or {}).get(pc.role_label) is None:
+        return False
+    conditions = (pod.status.conditions or []) if pod.status else []
+    return any(condition.type == 'Ready' and condition.status == 'True'
+               for condition in conditions)
+
+
+def report_time_to_first_test():
+    """ Logs and records the seconds from the process start to the
+    first test once
+    """
+    global has_reported_startup
+    if has_reported_startup:
+        return
+    has_reported_startup = True
+
+    seconds = get_process_uptime()
+    if seconds is None:
+        return
+    LoggingManager.logger.info(
+        "Time to first test: %.3f seconds", seconds,
+        extra={"stage": "startup",
+               "duration_ms": round(seconds * 1000, 3)})
+    mm.record_time_to_first_test(seconds)
+
+
+def get_process_uptime():
+    """ Gets the seconds since the process started from /proc
+
+    Returns:
+        float: The process uptime or None if /proc is unavailable
+    """
+    try:
+        with open('/proc/self/stat') as stat:
+            # fields after the command name, starttime is field 22
+            fields = stat.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as uptime:
+            system_uptime = float(uptime.read().split()[0])
+        return system_uptime - int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
 def is_host_primary_data_pod():
     """ Determine if the container is running on a
     primary or replica data pod.
@@ -272,23 +826,9 @@ def is_host_primary_data_pod():
     Returns:
         bool: True if Primary
     """
-    # cm.connect_to_kubernetes()
-    kube = ConnectionManager.kubernetes_connection
-    ns = os.getenv('NAMESPACE')
     host = os.getenv('HOSTNAME')
-    cluster_name = os.getenv('CLUSTER_NAME')
-
-    primary_label = 'postgres-operator.crunchydata.com/role=master'
-    cluster_label = "postgres-operator.crunchydata.com/cluster=%s" \
-        % (cluster_name)
-    labels = primary_label + "," + cluster_label
-    primary_pods = kube.list_namespaced_pod(namespace=ns,
-                                            label_selector=labels)
-    for pod in primary_pods.items:
-        if pod.metadata.name == host:
-            return True
-        else:
-            return False
+    return any(pod.metadata.name == host
+               for pod in pc.get_pods_by_role('master'))
 
 
 def rerun_tests():
@@ -299,12 +839,119 @@ def rerun_tests():
     is_primary = is_host_primary_data_pod()
     global has_run_as_primary
     if is_primary is True and has_run_as_primary is False:
+        start_tests()
+    elif is_primary is False:
+        # allow the tests to run again if this pod is promoted later
+        has_run_as_primary = False
+
+
+def on_role_changed(is_primary_pod):
+    """
+        Run the tests when a watched role change makes this pod primary.
+
+    Args:
+        is_primary_pod (bool): True if the pod is now the primary data pod
+    """
+    global is_primary
+    is_primary = is_primary_pod
+    global has_run_as_primary
+    if is_primary is True and has_run_as_primary is False:
+        start_tests()
+    elif is_primary is False:
+        # allow the tests to run again if this pod is promoted later
+        has_run_as_primary = False
+
+
+def start_tests():
+    """
+        Run the tests now, or ask the scheduler for a run so scheduled
+        runs never overlap.
+    """
+    if scheduler is not None:
+        scheduler.trigger()
+    else:
         run_tests()
 
 
+def watch_failover():
+    """
+        Rerun the tests each time this pod becomes the primary.
+    """
+    if os.getenv('FAILOVER_DETECTION').lower() == 'watch':
+        FailoverWatcher(on_role_changed).watch()
+    else:
+        while True:
+            time.sleep(30)
+            rerun_tests()
+
+
+def create_managers():
+    """
+        Loads the configuration, starts logging and creates the managers.
+        Nothing is created when the module is imported.
+    """
+    global lm, cm, dbm, rm, um, sm, bm, mm, tm, hm, vm, pc, hpm, csm, tbm
+    ConfigManager().load()
+    lm = LoggingManager()
+    lm.start()
+    cm = ConnectionManager()
+    dbm = DatabaseManager()
+    rm = ReplicaManager()
+    um = UserManager()
+    sm = SyncManager()
+    bm = BenchmarkManager()
+    mm = MetricsManager()
+    tm = TraceManager()
+    hm = HistoryManager()
+    vm = VisibilityProbeManager()
+    pc = PodCache()
+    hpm = HealthProbeManager()
+    csm = ConnectionStormManager()
+    tbm = TlsBenchmarkManager()
+
+
+def main():
+    """
+        Runs the tests in the configured run mode.
+    """
+    global scheduler
+    create_managers()
+
+    # exit cleanly on pod termination so queued log records are flushed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    # the kubernetes connection serves the pod cache until exit
+    atexit.register(cm.close_kubernetes_connection)
+    mm.start_server()
+
+    # test every matching cluster from one process
+    if os.getenv('RUN_MODE').lower() == 'controller':
+        ControllerManager().run()
+
+    # measure failover recovery times in the background
+    if os.getenv('RUN_MODE').lower() == 'sidecar' \
+            and os.getenv('FAILOVER_RTO_ENABLED').lower() == 'true':
+        FailoverRtoManager().start()
+
+    # run on a schedule and request a run on failover
+    if os.getenv('RUN_MODE').lower() == 'sidecar' \
+            and ScheduleManager.is_enabled():
+        scheduler = ScheduleManager(run_scheduled)
+        threading.Thread(target=watch_failover, name='failover',
+                         daemon=True).start()
+        scheduler.run()
+
+    run_tests()
+
+    # run once for the controller and report the outcome
+    if os.getenv('RUN_MODE').lower() == 'once':
+        write_run_result()
+        if not is_primary:
+            sys.exit(EXIT_NOT_PRIMARY)
+        sys.exit(0 if run_record.succeeded else 1)
+
+    watch_failover()
+
+
 # entry point
 if __name__ == '__main__':
-    run_tests()
-    while True:
-        time.sleep(30)
-        rerun_tests()
+    main()
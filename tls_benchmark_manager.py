@@ -0,0 +1,183 @@
+"""Contains the TlsBenchmarkManager class
+"""
+import os
+import random
+import time
+from config_manager import ConfigManager
+from connection_manager import ConnectionManager
+from connection_timer import ConnectionTimer
+from database_manager import DatabaseManager
+from db_connection_type import DBConnectionType
+from latency_histogram import LatencyHistogram
+from logging_manager import LoggingManager
+from psycopg2 import sql
+from trace_manager import TraceManager
+
+# the connection phases timed for each cycle
+PHASES = ('tcp', 'tls', 'auth', 'total')
+
+
+class TlsBenchmarkManager:
+    """Compares the connection handshake and per-query cost of sslmodes on
+    the primary service, the replica service and each replica pod by
+    repeating connect-and-query cycles
+    """
+
+    # initialize the managers
+    def __init__(self):
+        self.cfm = ConfigManager()
+        self.cm = ConnectionManager()
+        self.ct = ConnectionTimer()
+        self.dbm = DatabaseManager()
+
+    # provides the results of the last benchmark keyed by target
+    results = {}
+
+    @TraceManager.traced
+    def run_benchmarks(self, replica_pods):
+        """ Runs the sslmode comparison against each target in turn
+
+        Args:
+            replica_pods (list): The replica pods to target
+
+        Returns:
+            dict: Results by sslmode keyed by target
+        """
+        sslmodes = [sslmode.strip() for sslmode
+                    in os.getenv('TLS_BENCHMARK_SSLMODES').split(',')
+                    if sslmode.strip()]
+        cycles = max(1, int(os.getenv('TLS_BENCHMARK_CYCLES')))
+        queries = max(1, int(os.getenv('TLS_BENCHMARK_QUERIES')))
+
+        targets = [('primary_service', DBConnectionType.PRIMARY_SERVICE,
+                    None)]
+        if replica_pods:
+            targets.append(('replica_service',
+                            DBConnectionType.REPLICA_SERVICE, None))
+        targets.extend((pod.metadata.name, DBConnectionType.REPLICA_POD,
+                        pod) for pod in replica_pods)
+
+        self.results = {
+            name: self.run_benchmark(name, DBConnectionType, pod, sslmodes,
+                                     cycles, queries)
+            for name, DBConnectionType, pod in targets}
+        return self.results
+
+    def run_benchmark(self, name, DBConnectionType, pod, sslmodes, cycles,
+                      queries):
+        """ Repeats connect-and-query cycles on a target. The sslmodes take
+            turns in each cycle so drift in the network or the server
+            affects them alike.
+
+        Args:
+            name (str): The target name
+            DBConnectionType (Enum): The type of connection
+            pod (kubernetes.client.models.v1_pod): The target replica pod
+            or None for a service
+            sslmodes (list): The sslmodes to compare. The first is the
+            baseline of the overheads.
+            cycles (int): The number of connections per sslmode
+            queries (int): The number of queries per connection
+
+        Returns:
+            dict: Phase and query latencies and overheads by sslmode
+        """
+        LoggingManager.logger.info(
+            "Benchmarking sslmodes %s on %s with %s connections of %s "
+            "queries each", ', '.join(sslmodes), name, cycles, queries,
+            extra={"stage": "tls_benchmark", "target": name})
+
+        histograms = {sslmode: {phase: LatencyHistogram()
+                                for phase in PHASES + ('query',)}
+                      for sslmode in sslmodes}
+        errors = dict.fromkeys(sslmodes, 0)
+
+        for _ in range(cycles):
+            for sslmode in sslmodes:
+                params = self.cfm.get_test_db_connection_parameters(
+                    DBConnectionType, pod)
+                params["sslmode"] = sslmode
+                try:
+                    self.run_cycle(params, queries, histograms[sslmode])
+                except (Exception) as error:
+                    LoggingManager.logger.debug(
+                        "%s cycle on %s failed: %s", sslmode, name,
+                        str(error).strip())
+                    errors[sslmode] += 1
+
+        baseline = None
+        result = {}
+        for sslmode in sslmodes:
+            summaries = {phase: histogram.summary()
+                         for phase, histogram in histograms[sslmode].items()}
+            summaries["errors"] = errors[sslmode]
+            if baseline is None:
+                baseline = summaries
+            summaries["connect_overhead_ms"] = self.get_overhead(
+                summaries["total"], baseline["total"])
+            summaries["query_overhead_ms"] = self.get_overhead(
+                summaries["query"], baseline["query"])
+            result[sslmode] = summaries
+
+            LoggingManager.logger.info(
+                "sslmode %s on %s: connect p50 %s ms (tcp %s ms, tls %s ms, "
+                "auth %s ms), query p50 %s ms, %s errors. Overhead over %s: "
+                "%s ms per connection, %s ms per query", sslmode, name,
+                summaries["total"]["p50_ms"], summaries["tcp"]["p50_ms"],
+                summaries["tls"]["p50_ms"], summaries["auth"]["p50_ms"],
+                summaries["query"]["p50_ms"], errors[sslmode], sslmodes[0],
+                summaries["connect_overhead_ms"],
+                summaries["query_overhead_ms"],
+                extra={"stage": "tls_benchmark", "target": name,
+                       "sslmode": sslmode, "errors": errors[sslmode]})
+            if errors[sslmode] == cycles:
+                LoggingManager.logger.warning(
+                    "Every %s connection to %s failed", sslmode, name,
+                    extra={"stage": "tls_benchmark", "target": name,
+                           "sslmode": sslmode, "outcome": "failure"})
+        return result
+
+    def run_cycle(self, params, queries, histograms):
+        """ Opens a connection, runs point selects on it and closes it
+
+        Args:
+            params (dictionary): The connection string parameters
+            queries (int): The number of queries to run
+            histograms (dict): LatencyHistogram by phase and query
+        """
+        timing = self.ct.time_connect(params)
+        conn = timing.pop("conn")
+        # the run budget can cancel the benchmark queries
+        self.cm.track_connection(conn)
+        try:
+            for phase in PHASES:
+                if timing[phase] is not None:
+                    histograms[phase].record(timing[phase])
+
+            select_cmd = sql.SQL('SELECT md5 FROM {} WHERE s = %s').format(
+                sql.Identifier(self.dbm.schema_name, 'test_table'))
+            for _ in range(queries):
+                key = random.randint(1, self.dbm.row_count)
+                started = time.perf_counter()
+                cur = self.ct.execute(conn, select_cmd, (key,))
+                cur.fetchone()
+                histograms['query'].record(time.perf_counter() - started)
+                cur.close()
+        finally:
+            self.cm.untrack_connection(conn)
+            conn.close()
+
+    @staticmethod
+    def get_overhead(summary, baseline):
+        """ Gets the p50 latency difference from the baseline sslmode
+
+        Args:
+            summary (dict): A LatencyHistogram summary
+            baseline (dict): The baseline LatencyHistogram summary
+
+        Returns:
+            float: The difference in milliseconds or None
+        """
+        if summary["p50_ms"] is None or baseline["p50_ms"] is None:
+            return None
+        return round(summary["p50_ms"] - baseline["p50_ms"], 3)
@@ -0,0 +1,216 @@
+"""Contains the TraceManager class
+"""
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from logging_manager import LoggingManager
+
+# width of the waterfall bar in characters
+WATERFALL_WIDTH = 40
+
+
+@dataclass
+class Span:
+    """Simple class to store a timed span
+    """
+
+    name: str
+    span_id: str
+    parent_id: str
+    start: float
+    end: float = None
+    error: str = None
+
+
+class TraceManager:
+    """Records timed spans with parent/child relationships for a test run,
+    logs them as a waterfall and optionally exports them as OTLP JSON
+    """
+
+    # initialize static trace state
+    trace_id = None
+    root = None
+    spans = []
+    _lock = threading.Lock()
+    _local = threading.local()
+
+    @classmethod
+    def start_trace(cls, name, trace_id=None):
+        """ Starts a new trace with a root span
+
+        Args:
+            name (str): The name of the root span
+            trace_id (str, optional): A 32 character hex trace id.
+            Defaults to a random id.
+        """
+        with cls._lock:
+            cls.trace_id = trace_id or secrets.token_hex(16)
+            cls.spans = []
+            cls.root = cls.new_span(name, None)
+
+    @classmethod
+    def end_trace(cls):
+        """ Ends the root span of the trace
+
+        Returns:
+            list: The spans of the trace
+        """
+        if cls.root is not None and cls.root.end is None:
+            cls.root.end = time.time()
+        return cls.spans
+
+    @classmethod
+    def new_span(cls, name, parent):
+        """ Creates and stores a started span. The caller must hold the lock.
+
+        Args:
+            name (str): The name of the span
+            parent (Span): The parent span or None for a root span
+
+        Returns:
+            Span: The started span
+        """
+        span = Span(name, secrets.token_hex(8),
+                    parent.span_id if parent is not None else None,
+                    time.time())
+        cls.spans.append(span)
+        return span
+
+    @classmethod
+    @contextmanager
+    def span(cls, name):
+        """ Times the enclosed block as a child of the current span. Spans
+            started on worker threads are children of the root span.
+
+        Args:
+            name (str): The name of the span
+        """
+        stack = cls._local.__dict__.setdefault('stack', [])
+        with cls._lock:
+            parent = stack[-1] if stack else cls.root
+            span = cls.new_span(name, parent)
+        stack.append(span)
+        try:
+            yield span
+        except (Exception) as error:
+            span.error = repr(error)
+            raise
+        finally:
+            span.end = time.time()
+            stack.pop()
+
+    @classmethod
+    def traced(cls, function):
+        """ Decorates a function so each call is recorded as a span
+
+        Args:
+            function (function): The function to trace
+
+        Returns:
+            function: The traced function
+        """
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with cls.span(function.__qualname__):
+                return function(*args, **kwargs)
+        return wrapper
+
+    @classmethod
+    def propagate(cls, function):
+        """ Binds a function to the current span so spans it starts on a
+            worker thread are children of that span
+
+        Args:
+            function (function): The function to run on a worker thread
+
+        Returns:
+            function: The bound function
+        """
+        stack = cls._local.__dict__.get('stack')
+        parent = stack[-1] if stack else cls.root
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            worker_stack = cls._local.__dict__.setdefault('stack', [])
+            worker_stack.append(parent)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                worker_stack.pop()
+        return wrapper
+
+    @classmethod
+    def log_waterfall(cls):
+        """ Logs the spans of the trace as an indented waterfall with each
+            span's offset, duration and a bar relative to the root span
+        """
+        if cls.root is None:
+            return
+
+        total = max((cls.root.end or time.time()) - cls.root.start, 1e-9)
+        children = {}
+        for span in cls.spans:
+            children.setdefault(span.parent_id, []).append(span)
+
+        LoggingManager.logger.info("Trace %s waterfall (%.3f seconds):"
+                                   % (cls.trace_id, total))
+
+        def log_span(span, depth):
+            end = span.end or time.time()
+            offset = span.start - cls.root.start
+            first = int(offset / total * WATERFALL_WIDTH)
+            width = max(1, int((end - span.start) / total * WATERFALL_WIDTH))
+            bar = (' ' * first + '#' * width)[:WATERFALL_WIDTH]
+            LoggingManager.logger.info(
+                "%-66s %8.3fs %8.3fs |%-*s|%s"
+                % ('  ' * depth + span.name, offset, end - span.start,
+                   WATERFALL_WIDTH, bar, ' ERROR' if span.error else ''))
+            for child in sorted(children.get(span.span_id, []),
+                                key=lambda child: child.start):
+                log_span(child, depth + 1)
+
+        log_span(cls.root, 0)
+
+    @classmethod
+    def export(cls):
+        """ Appends the trace to the configured file as one OTLP JSON
+            ExportTraceServiceRequest per line
+        """
+        path = os.getenv('TRACE_EXPORT_PATH')
+        if not path or cls.root is None:
+            return
+
+        spans = []
+        for span in cls.spans:
+            otlp_span = {
+                "traceId": cls.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(int(span.start * 1e9)),
+                "endTimeUnixNano": str(int((span.end or span.start) * 1e9)),
+                "status": {"code": 2, "message": span.error}
+                if span.error else {"code": 1}
+            }
+            if span.parent_id is not None:
+                otlp_span["parentSpanId"] = span.parent_id
+            spans.append(otlp_span)
+
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name",
+                 "value": {"stringValue": "postgres-self-test"}},
+                {"key": "k8s.pod.name",
+                 "value": {"stringValue": os.getenv('HOSTNAME', '')}}]},
+            "scopeSpans": [{"scope": {"name": "self_test"},
+                            "spans": spans}]}]}
+
+        with open(path, 'a') as trace_file:
+            trace_file.write(json.dumps(request) + '\n')
+        LoggingManager.logger.debug("Exported trace %s to %s",
+                                    cls.trace_id, path)
@@ -7,6 +7,7 @@ from logging_manager import LoggingManager
 from password_manager import PasswordManager
 from psycopg2 import sql
 from test_user import TestUser
+from trace_manager import TraceManager
 
 
 class UserManager:
@@ -16,10 +17,10 @@ class UserManager:
         TestUser: TestUser object to manage password state
     """
 
-    lm = LoggingManager()
-
+    @TraceManager.traced
     def create_test_user(self, cur):
-        """Creates a test user object with a randomly generated password
+        """Creates a test user object with a randomly generated password.
+        An existing test_user is given the new password.
 
         Args:
             cur (psycopg2.connection.cursor): database connection cursor
@@ -32,8 +33,15 @@ class UserManager:
             pwd = PasswordManager.test_db_password
             test_user = TestUser("test_user", pwd)
 
-            # create test user and grant privileges
-            create_cmd = sql.SQL("CREATE USER test_user WITH PASSWORD {}")
+            # create the test user or reset the password of a test user
+            # kept from an earlier run, then grant privileges
+            cur.execute("SELECT 1 FROM pg_roles WHERE rolname = 'test_user'")
+            if cur.fetchone() is None:
+                create_cmd = sql.SQL("CREATE USER test_user "
+                                     "WITH PASSWORD {}")
+            else:
+                create_cmd = sql.SQL("ALTER USER test_user "
+                                     "WITH PASSWORD {}")
             create_cmd = create_cmd.format(sql.Literal(test_user.password))
             cur.execute(create_cmd)
             grant_cmd = sql.SQL('ALTER ROLE test_user WITH SUPERUSER CREATEDB')
@@ -43,6 +51,32 @@ class UserManager:
         except (Exception) as error:
             LoggingManager.logger.error(error)
 
+    @TraceManager.traced
+    def create_storm_user(self, cur):
+        """Creates the connection storm user, a login role that is not a
+        superuser so the storm cannot use the reserved connection slots.
+        It can read the activity of every session to measure headroom.
+        An existing storm user is given the new password.
+
+        Args:
+            cur (psycopg2.connection.cursor): database connection cursor
+        """
+        try:
+            pwd = PasswordManager.test_db_password
+            cur.execute(
+                "SELECT 1 FROM pg_roles WHERE rolname = 'test_storm_user'")
+            if cur.fetchone() is None:
+                create_cmd = sql.SQL("CREATE USER test_storm_user "
+                                     "WITH NOSUPERUSER PASSWORD {}")
+            else:
+                create_cmd = sql.SQL("ALTER USER test_storm_user "
+                                     "WITH NOSUPERUSER PASSWORD {}")
+            cur.execute(create_cmd.format(sql.Literal(pwd)))
+            # count the sessions of other users in pg_stat_activity
+            cur.execute("GRANT pg_read_all_stats TO test_storm_user")
+        except (Exception) as error:
+            LoggingManager.logger.error(error)
+
     def switch_to_test_user(self, cur):
         """Changes the active ROLE to test_user
 
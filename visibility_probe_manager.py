@@ -0,0 +1,178 @@
+"""Contains the VisibilityProbeManager class
+"""
+import os
+import threading
+import time
+from connection_manager import ConnectionManager
+from database_manager import DatabaseManager
+from databases import Databases
+from db_connection_type import DBConnectionType
+from latency_histogram import LatencyHistogram
+from logging_manager import LoggingManager
+from psycopg2 import sql
+from trace_manager import TraceManager
+
+
+class VisibilityProbeManager:
+    """Measures how long a heartbeat committed on the primary takes to
+    become visible on each replica pod and through the replica service
+    """
+
+    # initialize the managers
+    def __init__(self):
+        self.cm = ConnectionManager()
+        self.dbm = DatabaseManager()
+
+    # provides the results of the last probe keyed by target
+    results = {}
+
+    # provides the heartbeat table name
+    table_name = 'heartbeat'
+
+    @TraceManager.traced
+    def run_probe(self, primary_cur, replica_pods):
+        """ Writes heartbeats to the primary at the configured rate while
+            every replica pod and the replica service poll for them.
+            Latency is measured from the commit acknowledgement to the
+            first poll that sees the heartbeat, both on the sidecar's
+            monotonic clock, so clock skew between pods does not matter.
+
+        Args:
+            primary_cur (connection.cursor): The primary test db cursor
+            replica_pods (list): The replica pods to probe
+
+        Returns:
+            dict: Heartbeats, misses and latency percentiles by target
+        """
+        rate = float(os.getenv('VISIBILITY_PROBE_RATE'))
+        duration = float(os.getenv('VISIBILITY_PROBE_DURATION'))
+        poll_interval = float(os.getenv('VISIBILITY_PROBE_POLL_INTERVAL'))
+        timeout = float(os.getenv('REPLICATION_TIMEOUT'))
+        heartbeats = max(1, int(rate * duration))
+
+        table = sql.Identifier(self.dbm.schema_name, self.table_name)
+        primary_cur.execute(sql.SQL('DROP TABLE IF EXISTS {}').format(table))
+        primary_cur.execute(sql.SQL(
+            'CREATE TABLE {} (id bigint PRIMARY KEY, '
+            'written_at timestamptz NOT NULL)').format(table))
+
+        # the replica service is probed on one connection, which stays on
+        # the replica pod the service chose for it
+        targets = [(pod.metadata.name, DBConnectionType.REPLICA_POD, pod)
+                   for pod in replica_pods]
+        targets.append(('replica_service', DBConnectionType.REPLICA_SERVICE,
+                        None))
+
+        LoggingManager.logger.info(
+            "Probing replication visibility of %s heartbeats at %s/s on "
+            "%s target(s)", heartbeats, rate, len(targets),
+            extra={"stage": "visibility_probe", "heartbeats": heartbeats})
+
+        histograms = {name: LatencyHistogram() for name, _, _ in targets}
+        commit_times = {}
+        # holds the reader deadline once writing is done
+        written = []
+
+        # start writing once every reader is connected
+        ready = threading.Barrier(len(targets) + 1)
+        threads = [threading.Thread(
+            target=self.run_reader,
+            args=(DBConnectionType, pod, ready, heartbeats, commit_times,
+                  written, histograms[name], poll_interval))
+            for name, DBConnectionType, pod in targets]
+        for thread in threads:
+            thread.start()
+        ready.wait()
+
+        insert_cmd = sql.SQL('INSERT INTO {} (id, written_at) '
+                             'VALUES (%s, clock_timestamp())').format(table)
+        started = time.perf_counter()
+        try:
+            for heartbeat in range(1, heartbeats + 1):
+                delay = started + (heartbeat - 1) / rate \
+                    - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                primary_cur.execute(insert_cmd, (heartbeat,))
+                commit_times[heartbeat] = time.perf_counter()
+        finally:
+            # the readers stop at the deadline if heartbeats are missing
+            written.append(time.perf_counter() + timeout)
+            for thread in threads:
+                thread.join()
+        primary_cur.execute(sql.SQL('DROP TABLE {}').format(table))
+
+        self.results = {}
+        for name, histogram in histograms.items():
+            result = histogram.summary()
+            result["heartbeats"] = heartbeats
+            result["missed"] = heartbeats - histogram.count
+            self.results[name] = result
+            LoggingManager.logger.info(
+                "Visibility latency on %s: p50 %s ms, p95 %s ms, p99 %s ms, "
+                "max %s ms, %s of %s heartbeats missed", name,
+                result["p50_ms"], result["p95_ms"], result["p99_ms"],
+                result["max_ms"], result["missed"], heartbeats,
+                extra={"stage": "visibility_probe", "target": name,
+                       **result})
+        return self.results
+
+    def run_reader(self, DBConnectionType, pod, ready, heartbeats,
+                   commit_times, written, histogram, poll_interval):
+        """ Polls a replica for the newest heartbeat and records the
+            latency of each heartbeat when it first becomes visible
+
+        Args:
+            DBConnectionType (Enum): The type of replica connection
+            pod (kubernetes.client.models.v1_pod): The target replica pod
+            or None for the replica service
+            ready (threading.Barrier): Released when all readers connect
+            heartbeats (int): The number of heartbeats to be written
+            commit_times (dict): perf_counter commit times by heartbeat
+            written (list): Holds the perf_counter deadline once writing
+            is done
+            histogram (LatencyHistogram): Records visibility latencies
+            poll_interval (float): Seconds between polls
+        """
+        conn = None
+        try:
+            conn = self.cm.get_connection(Databases.TEST_DB,
+                                          DBConnectionType, pod)
+        except (Exception) as error:
+            LoggingManager.logger.error(error, exc_info=True)
+        finally:
+            ready.wait()
+
+        if conn is None:
+            return
+
+        table = sql.Identifier(self.dbm.schema_name, self.table_name)
+        select_cmd = sql.SQL('SELECT max(id) FROM {}').format(table)
+        seen = 0
+
+        try:
+            with conn.cursor() as cur:
+                while True:
+                    try:
+                        cur.execute(select_cmd)
+                        visible = min(cur.fetchone()[0] or 0, heartbeats)
+                    except (Exception) as error:
+                        # the table is not replayed yet
+                        LoggingManager.logger.debug(error)
+                        visible = 0
+                    now = time.perf_counter()
+
+                    # a heartbeat seen before its commit was acknowledged
+                    # to the writer became visible without delay
+                    for heartbeat in range(seen + 1, visible + 1):
+                        histogram.record(max(
+                            now - commit_times.get(heartbeat, now), 0))
+                    seen = max(seen, visible)
+
+                    if seen >= heartbeats or (written
+                                              and now > written[0]):
+                        break
+                    time.sleep(poll_interval)
+        finally:
+            self.cm.close_connection(conn, Databases.TEST_DB,
+                                     DBConnectionType)